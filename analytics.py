@@ -0,0 +1,89 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from scanner_logic import CERT_WARNING_DAYS, SCORE_WEIGHTS
+
+# Analyse d'un portefeuille de domaines : les résultats sont mis à plat en colonnes typées
+# puis scorés et agrégés en une passe vectorisée (pas de boucle Python par domaine)
+
+FRAME_COLUMNS = (
+    "domain", "scanned_at", "ssl_status", "ssl_days_left", "ssl_issuer",
+    "open_ports", "dmarc", "headers_status", "hsts",
+)
+
+DTYPES = {
+    "scanned_at": "float64",
+    "ssl_status": "bool",
+    "ssl_days_left": "int32",
+    "dmarc": "bool",
+    "headers_status": "bool",
+    "hsts": "bool",
+}
+
+# Tranches de score, mêmes seuils que le rapport PDF
+SCORE_BANDS = ((0, "CRITIQUE"), (50, "MOYEN"), (80, "EXCELLENT"))
+
+def frame_from_rows(rows):
+    # Tuples bruts de ScanStore.latest_rows(FRAME_COLUMNS) -> DataFrame typé
+    df = pd.DataFrame.from_records(rows, columns=FRAME_COLUMNS).astype(DTYPES)
+    # Ports ouverts gardés en texte "22,3389" : seul leur nombre sert au score
+    df["nb_open_ports"] = (df["open_ports"].str.count(",") + (df["open_ports"] != "")).astype("int16")
+    return df
+
+def frame_from_results(results):
+    # Résultats de run_full_scan / scan_batch -> même mise à plat que depuis la base
+    return frame_from_rows([
+        (
+            r["domain"], r.get("scanned_at", time.time()), r["ssl"]["status"], r["ssl"].get("days_left", 0),
+            r["ssl"].get("issuer"), ",".join(str(p) for p in r["open_ports"]),
+            r["email"]["dmarc"], r["headers"]["status"], r["headers"]["hsts"],
+        )
+        for r in results
+    ])
+
+def load_portfolio(store, owner=None):
+    # Dernier audit de chaque domaine de l'historique (de cet utilisateur si owner est donné)
+    return frame_from_rows(store.latest_rows(FRAME_COLUMNS, owner))
+
+def score_frame(df, weights=None):
+    # Équivalent vectorisé de scanner_logic.calculate_score
+    w = dict(SCORE_WEIGHTS, **(weights or {}))
+    ssl_ok = df["ssl_status"].to_numpy()
+    days_left = df["ssl_days_left"].to_numpy()
+    nb_ports = df["nb_open_ports"].to_numpy()
+    headers_ok = df["headers_status"].to_numpy()
+    score = np.where(ssl_ok, np.where(days_left > CERT_WARNING_DAYS, w["ssl"], w["ssl_expiring"]), 0)
+    score = score + np.maximum(0, w["ports"] - nb_ports * w["per_open_port"])
+    score = score + df["dmarc"].to_numpy() * w["email"]
+    score = score + headers_ok * w["headers"]
+    score = score - (headers_ok & ~df["hsts"].to_numpy()) * w["missing_hsts"]
+    # Même plancher que calculate_score : une pondération à 0 ne donne pas de score négatif
+    return pd.Series(np.maximum(score, 0).astype("int16"), index=df.index, name="score")
+
+def score_distribution(scores):
+    # Nombre de domaines par tranche (CRITIQUE / MOYEN / EXCELLENT)
+    bounds = [low for low, _ in SCORE_BANDS]
+    counts = np.bincount(np.searchsorted(bounds, scores.to_numpy(), side="right") - 1, minlength=len(bounds))
+    return pd.Series(counts, index=[label for _, label in SCORE_BANDS], name="domaines")
+
+def worst_offenders(df, scores, n=10):
+    worst = np.argsort(scores.to_numpy(), kind="stable")[:n]
+    return df.iloc[worst][["domain", "open_ports", "ssl_days_left"]].assign(score=scores.iloc[worst].to_numpy())
+
+def expiring_certificates(df, days=30, now=None):
+    # Jours restants recalculés à aujourd'hui (le résultat stocké date du dernier audit)
+    now = now or time.time()
+    days_left = df["ssl_days_left"].to_numpy() - (now - df["scanned_at"].to_numpy()) // 86400
+    mask = df["ssl_status"].to_numpy() & (days_left <= days)
+    expiring = df.loc[mask, ["domain", "ssl_issuer"]].assign(days_left=days_left[mask].astype("int32"))
+    return expiring.sort_values("days_left")
+
+def port_exposure(df):
+    # Nombre de domaines exposant chaque port
+    exposed = df.loc[df["nb_open_ports"].to_numpy() > 0, "open_ports"]
+    if exposed.empty:
+        return pd.Series(dtype="int64", name="domaines")
+    counts = exposed.str.split(",").explode().astype("int32").value_counts()
+    return counts.rename("domaines").rename_axis("port")
@@ -1,9 +1,18 @@
 import streamlit as st
-from scanner_logic import run_full_scan
-from fpdf import FPDF
+from scanner_logic import iter_full_scan, PORT_PROFILES, SCORE_WEIGHTS, SPF_MAX_LOOKUPS
+from scan_store import ScanStore
+from jobs import JobQueue, JobWorkers
+from scheduler import Scheduler, SchedulerWorker
+from metrics import start_metrics_server
+import os
+from report_pdf import create_pdf_bytes, export_reports_zip
+import analytics
 import pandas as pd
 import datetime
 import time
+import csv
+import io
+import tempfile
 
 # --- 1. CONFIGURATION ---
 st.set_page_config(page_title="CyberAudit", page_icon="⚡", layout="wide", initial_sidebar_state="expanded")
@@ -19,7 +28,38 @@ def local_css(file_name):
 local_css("style.css")
 
 # --- 2. INITIALISATION MEMOIRE ---
-if 'history' not in st.session_state: st.session_state['history'] = []
+# Historique persistant, partagé entre sessions (SQLite)
+@st.cache_resource
+def get_scan_store():
+    return ScanStore()
+
+scan_store = get_scan_store()
+
+# Endpoint Prometheus /metrics, lancé une seule fois par process si le port est configuré
+@st.cache_resource
+def get_metrics_server():
+    port = os.environ.get("CYBERAUDIT_METRICS_PORT")
+    return start_metrics_server(int(port)) if port else None
+
+get_metrics_server()
+
+# File d'audits en masse + workers de fond partagés par toutes les sessions
+@st.cache_resource
+def get_job_queue():
+    queue = JobQueue()
+    JobWorkers(queue, get_scan_store())
+    return queue
+
+job_queue = get_job_queue()
+
+# Re-audits planifiés (surveillance), un seul thread de fond par process
+@st.cache_resource
+def get_scheduler():
+    scheduler = Scheduler()
+    SchedulerWorker(scheduler)
+    return scheduler
+
+scheduler = get_scheduler()
 if 'saved_author' not in st.session_state: st.session_state['saved_author'] = "CyberAudit"
 if 'scan_count' not in st.session_state: st.session_state['scan_count'] = 0
 
@@ -86,6 +126,40 @@ def get_card_html(title, value, badge_text, badge_color, icon_name):
     </div>
     """
 
+CARD_TITLES = {"score": "Score Global", "ssl": "Certificat SSL", "open_ports": "Ports Ouverts", "email": "Email DMARC", "headers": "Sécurité Web"}
+
+def get_result_card_html(name, result):
+    if name == "score":
+        color = "#10b981" if result['score'] >= 80 else "#ef4444"
+        return get_card_html(CARD_TITLES[name], f"{result['score']}%", "Excellent" if result['score']>=80 else "Critique", color, "verified_user")
+    if name == "ssl":
+        color = "#10b981" if result['status'] else "#ef4444"
+        return get_card_html(CARD_TITLES[name], "Valide" if result['status'] else "Expiré", f"{result.get('days_left',0)} jours", color, "lock")
+    if name == "open_ports":
+        nb = len(result)
+        color = "#10b981" if nb == 0 else "#ef4444"
+        return get_card_html(CARD_TITLES[name], str(nb), "Sécurisé", color, "router")
+    if name == "email":
+        color = "#10b981" if result['dmarc'] else "#f59e0b"
+        return get_card_html(CARD_TITLES[name], "Actif" if result['dmarc'] else "Manquant", "Anti-Spoofing", color, "mark_email_read")
+    color = "#10b981" if result['status'] else "#ef4444"
+    status_txt = "Sécurisé" if result['status'] else "Risque"
+    return get_card_html(CARD_TITLES[name], status_txt, "Headers", color, "shield")
+
+def email_details(email):
+    # DMARC (politique), SPF, DKIM, MTA-STS et TLS-RPT sur une ligne
+    parts = [f"DMARC p={email.get('dmarc_policy')}" if email['dmarc'] else "Pas de DMARC"]
+    if email.get('dmarc_inherited_from'):
+        parts[0] += f" (hérité de {email['dmarc_inherited_from']})"
+    if email.get('spf_error'):
+        parts.append(f"SPF invalide ({email['spf_error']})")
+    elif 'spf' in email:
+        parts.append(f"SPF {email['spf_all']} ({email['spf_lookups']}/{SPF_MAX_LOOKUPS} lookups)" if email['spf'] else "Pas de SPF")
+    if email.get('dkim'):
+        parts.append(f"DKIM: {', '.join(email['dkim'])}")
+    parts += [name for name, key in (("MTA-STS", "mta_sts"), ("TLS-RPT", "tls_rpt")) if email.get(key)]
+    return " · ".join(parts)
+
 def get_row_html(label, status, detail):
     color = "#10b981" if status else "#ef4444"
     icon = "check_circle" if status else "cancel"
@@ -117,153 +191,90 @@ def render_vip_stats(placeholder):
         </div>
     """, unsafe_allow_html=True)
 
-# --- 6. PDF GENERATOR ---
-class PDFReport(FPDF):
-    def __init__(self, author_name="CyberAudit"):
-        super().__init__()
-        self.author_name = author_name
-
-    def header(self):
-        self.set_fill_color(15, 23, 42)
-        self.rect(0, 0, 210, 50, 'F')
-        self.set_y(20)
-        self.set_font('Arial', 'B', 24)
-        self.set_x(10)
-        if self.author_name == "CyberAudit" or not self.author_name:
-            self.set_text_color(255, 255, 255)
-            w_cyber = self.get_string_width("Cyber")
-            self.cell(w_cyber, 10, "Cyber", 0, 0)
-            self.set_text_color(59, 130, 246)
-            self.cell(0, 10, "Audit", 0, 0)
-        else:
-            self.set_text_color(255, 255, 255)
-            self.cell(0, 10, self.author_name, 0, 0)
-        self.set_font('Arial', '', 10)
-        self.set_text_color(148, 163, 184)
-        self.set_x(-70)
-        self.cell(60, 10, f'Réf: AUDIT-{datetime.date.today().strftime("%Y%m%d")}', 0, 0, 'R')
-        self.ln(40)
-
-    def footer(self):
-        self.set_y(-30)
-        self.set_font('Arial', 'I', 8)
-        self.set_text_color(100, 116, 139)
-        self.multi_cell(0, 4, f"Rapport généré par {self.author_name}. Ne remplace pas un pentest complet.", align='C')
-        self.ln(2)
-        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
-
-def create_pdf_bytes(data, author_name):
-    pdf = PDFReport(author_name=author_name)
-    pdf.add_page()
-    
-    # TITRE
-    pdf.set_font("Arial", 'B', 20)
-    pdf.set_text_color(15, 23, 42)
-    pdf.write(10, "Rapport d'Audit")
-    pdf.set_text_color(15, 23, 42)
-    pdf.write(10, f" : {data['domain']}")
-    pdf.ln(15)
-    
-    # DATE
-    pdf.set_font("Arial", '', 11)
-    pdf.set_text_color(100, 116, 139)
-    pdf.cell(0, 10, f"Généré le {datetime.datetime.now().strftime('%d/%m/%Y à %H:%M')}", 0, 1)
-    pdf.ln(10)
-    
-    # SCORE
-    if data['score'] >= 80: bg=(220,252,231); txt=(21,128,61); label="EXCELLENT"
-    elif data['score'] >= 50: bg=(254,249,195); txt=(161,98,7); label="MOYEN"
-    else: bg=(254,226,226); txt=(185,28,28); label="CRITIQUE"
-    
-    pdf.set_fill_color(*bg)
-    pdf.rect(10, pdf.get_y(), 190, 35, 'F')
-    pdf.set_y(pdf.get_y() + 5)
-    pdf.set_font("Arial", 'B', 12)
-    pdf.set_text_color(100,100,100)
-    pdf.cell(0, 8, "SCORE DE SÉCURITÉ", 0, 1, 'C')
-    pdf.set_font("Arial", 'B', 26)
-    pdf.set_text_color(*txt)
-    pdf.cell(0, 12, f"{data['score']} / 100", 0, 1, 'C')
-    pdf.set_font("Arial", 'B', 10)
-    pdf.cell(0, 8, label, 0, 1, 'C')
-    pdf.ln(15)
-    
-    # SECTION TECH
-    pdf.set_font("Arial", 'B', 14)
-    pdf.set_text_color(15, 23, 42)
-    pdf.cell(0, 10, "Analyse Technique", 0, 1)
-    pdf.set_draw_color(226, 232, 240)
-    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-    pdf.ln(5)
-    
-    # --- METHODE SANS FONCTION (ANTI "NONE") ---
-    
-    # 1. SSL
-    pdf.set_font("Arial", 'B', 11)
-    pdf.set_text_color(15, 23, 42)
-    pdf.cell(120, 8, "SSL/TLS", 0, 0)
-    ok = data['ssl']['status']
-    pdf.set_text_color(21, 128, 61) if ok else pdf.set_text_color(185, 28, 28)
-    pdf.cell(0, 8, "CONFORME" if ok else "ATTENTION", 0, 1, 'R')
-    pdf.set_font("Arial", '', 10)
-    pdf.set_text_color(71, 85, 105)
-    pdf.cell(0, 6, f"Résultat : Valide ({data['ssl'].get('days_left',0)} jours)", 0, 1)
-    pdf.ln(2)
-    pdf.set_draw_color(241, 245, 249)
-    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-    pdf.ln(4)
-
-    # 2. INFRA
-    pdf.set_font("Arial", 'B', 11)
-    pdf.set_text_color(15, 23, 42)
-    pdf.cell(120, 8, "Infrastructure", 0, 0)
-    ok = len(data['open_ports'])==0
-    pdf.set_text_color(21, 128, 61) if ok else pdf.set_text_color(185, 28, 28)
-    pdf.cell(0, 8, "CONFORME" if ok else "ATTENTION", 0, 1, 'R')
-    pdf.set_font("Arial", '', 10)
-    pdf.set_text_color(71, 85, 105)
-    res_txt = f"Ports: {data['open_ports']}" if data['open_ports'] else "Aucun port critique"
-    pdf.cell(0, 6, f"Résultat : {res_txt}", 0, 1)
-    pdf.ln(2)
-    pdf.set_draw_color(241, 245, 249)
-    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-    pdf.ln(4)
-
-    # 3. EMAIL
-    pdf.set_font("Arial", 'B', 11)
-    pdf.set_text_color(15, 23, 42)
-    pdf.cell(120, 8, "Email DMARC", 0, 0)
-    ok = data['email']['dmarc']
-    pdf.set_text_color(21, 128, 61) if ok else pdf.set_text_color(185, 28, 28)
-    pdf.cell(0, 8, "CONFORME" if ok else "ATTENTION", 0, 1, 'R')
-    pdf.set_font("Arial", '', 10)
-    pdf.set_text_color(71, 85, 105)
-    res_txt = "Actif" if data['email']['dmarc'] else "Manquant"
-    pdf.cell(0, 6, f"Résultat : {res_txt}", 0, 1)
-    pdf.ln(2)
-    pdf.set_draw_color(241, 245, 249)
-    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-    pdf.ln(4)
-
-    # 4. HEADERS
-    pdf.set_font("Arial", 'B', 11)
-    pdf.set_text_color(15, 23, 42)
-    pdf.cell(120, 8, "Sécurité Web (Headers)", 0, 0)
-    ok = data['headers']['status']
-    pdf.set_text_color(21, 128, 61) if ok else pdf.set_text_color(185, 28, 28)
-    pdf.cell(0, 8, "CONFORME" if ok else "ATTENTION", 0, 1, 'R')
-    pdf.set_font("Arial", '', 10)
-    pdf.set_text_color(71, 85, 105)
-    headers_txt = "Headers Sécurisés" if data['headers']['status'] else "Headers Manquants (HSTS/X-Frame)"
-    pdf.cell(0, 6, f"Résultat : {headers_txt}", 0, 1)
-    
-    return pdf.output(dest='S').encode('latin-1')
+# --- 6. IMPORT CSV/TXT ---
+def read_domains_file(uploaded_file):
+    # Première colonne de chaque ligne ; les lignes sans point (en-têtes, vides) sont ignorées
+    content = io.StringIO(uploaded_file.getvalue().decode("utf-8", errors="ignore"))
+    for row in csv.reader(content):
+        if row and "." in row[0]:
+            yield row[0].strip()
+
+JOB_STATUS = {"queued": "⏳ En attente", "running": "⚙️ En cours", "done": "✅ Terminé", "failed": "❌ Échec"}
+
+def render_jobs(jobs):
+    if not jobs:
+        st.info("Aucun audit en masse.")
+        return
+    for job in jobs:
+        label = f"#{job['id']} — {JOB_STATUS[job['status']]} — {job['done']} / {job['total']} domaines"
+        with st.expander(label, expanded=job['status'] == "running"):
+            st.progress(job['done'] / job['total'] if job['total'] else 1.0)
+            if job['started_at'] and job['done']:
+                elapsed = max((job['finished_at'] or time.time()) - job['started_at'], 1e-6)
+                st.caption(f"Débit : {job['done'] / elapsed:.2f} domaines/s")
+            if job['error']:
+                st.error(job['error'])
+            if job['done']:
+                rows = scan_store.fetch_page(0, 100, job_id=job['id'])
+                st.dataframe(pd.DataFrame([{"domain": r['domain'], "score": r['score']} for r in rows]), use_container_width=True, hide_index=True)
+            if job['status'] == "done" and job['done']:
+                render_zip_export(job['id'])
+
+def render_surface(surface):
+    k1, k2, k3, k4 = st.columns(4)
+    k1.metric("Hôtes exposés", len(surface['hosts']), f"{surface['candidates']} noms testés", delta_color="off")
+    k2.metric("Adresses IP", len(surface['ips']))
+    k3.metric("Score de la surface", f"{surface['score']}%", "hôte le plus faible", delta_color="off")
+    k4.metric("Ports critiques", len(surface['open_ports']))
+    if surface['wildcard']:
+        st.warning(f"DNS joker détecté ({', '.join(surface['wildcard'])}) : les noms pointant vers ces IP sont ignorés.")
+    st.dataframe(pd.DataFrame([
+        {
+            "hôte": h['domain'],
+            "IP": ", ".join(h['addresses']),
+            "score": h['score'],
+            "SSL": f"{h['ssl'].get('days_left', 0)} j" if h['ssl']['status'] else "invalide",
+            "ports": ", ".join(map(str, h['open_ports'])),
+            "headers manquants": ", ".join(h['headers']['missing']),
+        }
+        for h in surface['hosts']
+    ]), use_container_width=True, hide_index=True)
+    st.caption(f"Surface de {surface['domain']} auditée en {surface['duration']:.1f} s")
+
+def render_zip_export(job_id):
+    # Les PDF sont écrits au fil de l'eau dans un ZIP sur disque, un seul fichier par job :
+    # une nouvelle préparation remplace la précédente, rien ne s'accumule dans le dossier temporaire
+    path = os.path.join(tempfile.gettempdir(), f"cyberaudit_job{job_id}.zip")
+    if st.button("📦 Préparer les rapports PDF (ZIP)", key=f"zip_{job_id}"):
+        with st.spinner("Génération des rapports..."):
+            # Écrit à côté puis renommé : un téléchargement en cours ne lit jamais un ZIP à moitié écrit
+            fd, partial = tempfile.mkstemp(prefix=f"cyberaudit_job{job_id}_", suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    export_reports_zip(scan_store.iter_scans(job_id=job_id), st.session_state['saved_author'], f)
+                os.replace(partial, path)
+            except Exception:
+                os.remove(partial)
+                raise
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            st.download_button("📥 Télécharger le ZIP", data=f, file_name=f"Audits_{job_id}.zip", mime="application/zip", key=f"dl_{job_id}")
+
+# Portefeuille mis en cache par utilisateur : rechargé seulement quand un audit est enregistré
+# (latest_id change), re-scoré seulement quand la pondération change
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_portfolio(owner, latest_id):
+    return analytics.load_portfolio(scan_store, owner)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def score_portfolio(owner, latest_id, weights):
+    return analytics.score_frame(load_portfolio(owner, latest_id), dict(weights))
 
 # --- 6. SIDEBAR ---
 with st.sidebar:
     st.markdown("""<div style="padding: 10px 0px;"><h2 style="margin:0; font-size: 22px; font-weight: 700;"><span style="color: #f1f5f9;">Cyber</span><span style="color:#3b82f6">Audit</span></h2></div>""", unsafe_allow_html=True)
     st.markdown("---")
-    menu = st.radio("Navigation", ["Dashboard", "Mes Rapports", "Configuration"], label_visibility="collapsed")
+    menu = st.radio("Navigation", ["Dashboard", "Surface d'attaque", "Audit en masse", "Surveillance", "Mes Rapports", "Configuration"], label_visibility="collapsed")
     st.markdown("---")
     
     # FEEDBACK (VERSION SELECTBOX GARDÉE)
@@ -300,66 +311,239 @@ if menu == "Dashboard":
     st.markdown(f"""<div><h1 style="margin:0;">Bonjour, {user_name} 👋</h1><p style="margin-top: 5px; color: #94a3b8;">Voici l'état de vos analyses de sécurité aujourd'hui.</p></div><br>""", unsafe_allow_html=True)
     
     with st.form("scan_form", clear_on_submit=False):
-        c1, c2 = st.columns([3, 1], vertical_alignment="bottom")
+        c1, c3, c2 = st.columns([3, 1, 1], vertical_alignment="bottom")
         with c1:
             domain = st.text_input("Rechercher un domaine...", placeholder="ex: mon-client.com", label_visibility="collapsed")
+        with c3:
+            port_profile = st.selectbox("Profil de ports", list(PORT_PROFILES), label_visibility="collapsed")
         with c2:
             submitted = st.form_submit_button("Lancer l'audit ✨", type="primary", use_container_width=True)
+        force_refresh = st.checkbox("Forcer l'actualisation (ignorer le cache)")
+
+    new_scan = submitted and domain
+    if new_scan:
+        events = iter_full_scan(domain, port_profile=port_profile, force_refresh=force_refresh)
+        shown_domain = domain
+    elif 'last_scan' in st.session_state:
+        # Rerun (clic sur un widget) : on réaffiche le dernier audit sans le relancer
+        last_scan = st.session_state['last_scan']
+        events = [(name, last_scan[name]) for name in ("ssl", "open_ports", "email", "headers")] + [("score", last_scan)]
+        shown_domain = last_scan['domain']
+    else:
+        events = None
+
+    if events is not None:
+        st.markdown("<br>", unsafe_allow_html=True)
+        st.markdown(f"<h3>Résultats pour <span style='color:#3b82f6'>{shown_domain}</span></h3>", unsafe_allow_html=True)
+        
+        # Chaque carte se remplit dès que son check répond
+        k1, k2, k3, k4, k5 = st.columns(5)
+        cards = {"score": k1.empty(), "ssl": k2.empty(), "open_ports": k3.empty(), "email": k4.empty(), "headers": k5.empty()}
+        for name, placeholder in cards.items():
+            placeholder.markdown(get_card_html(CARD_TITLES[name], "...", "Analyse", "#94a3b8", "hourglass_empty"), unsafe_allow_html=True)
 
-    if submitted and domain:
-        with st.spinner("Analyse intelligente en cours..."):
-            time.sleep(0.5)
-            data = run_full_scan(domain)
+        for name, result in events:
+            cards[name].markdown(get_result_card_html(name, result), unsafe_allow_html=True)
+            if name == "score":
+                data = result
+        if new_scan:
             st.session_state['scan_count'] += 1
-            st.session_state['history'].insert(0, data)
+            st.session_state['last_scan'] = data
+            scan_store.save_scan(data, owner=user_name)
             
             # MISE A JOUR DU COMPTEUR VIP APRES LE SCAN
             render_vip_stats(vip_placeholder)
-        
-        st.markdown("<br>", unsafe_allow_html=True)
-        st.markdown(f"<h3>Résultats pour <span style='color:#3b82f6'>{domain}</span></h3>", unsafe_allow_html=True)
-        
-        k1, k2, k3, k4, k5 = st.columns(5)
-        with k1:
-            color = "#10b981" if data['score'] >= 80 else "#ef4444"
-            st.markdown(get_card_html("Score Global", f"{data['score']}%", "Excellent" if data['score']>=80 else "Critique", color, "verified_user"), unsafe_allow_html=True)
-        with k2:
-            color = "#10b981" if data['ssl']['status'] else "#ef4444"
-            st.markdown(get_card_html("Certificat SSL", "Valide" if data['ssl']['status'] else "Expiré", f"{data['ssl'].get('days_left',0)} jours", color, "lock"), unsafe_allow_html=True)
-        with k3:
-            nb = len(data['open_ports'])
-            color = "#10b981" if nb == 0 else "#ef4444"
-            st.markdown(get_card_html("Ports Ouverts", str(nb), "Sécurisé", color, "router"), unsafe_allow_html=True)
-        with k4:
-            color = "#10b981" if data['email']['dmarc'] else "#f59e0b"
-            st.markdown(get_card_html("Email DMARC", "Actif" if data['email']['dmarc'] else "Manquant", "Anti-Spoofing", color, "mark_email_read"), unsafe_allow_html=True)
-        with k5:
-            color = "#10b981" if data['headers']['status'] else "#ef4444"
-            status_txt = "Sécurisé" if data['headers']['status'] else "Risque"
-            st.markdown(get_card_html("Sécurité Web", status_txt, "Headers", color, "shield"), unsafe_allow_html=True)
+        timings_txt = " · ".join(f"{stage} {ms:.0f} ms" for stage, ms in data['timings'].items() if stage != "total")
+        st.caption(f"Audit en {data['timings']['total']:.0f} ms — {timings_txt}")
 
         st.markdown("<br>", unsafe_allow_html=True)
         col_L, col_R = st.columns([2, 1])
         with col_L:
             st.markdown("### Détails Techniques")
-            st.markdown(get_row_html("Chiffrement SSL/TLS", data['ssl']['status'], f"Issuer: {data['ssl'].get('issuer', 'Unknown')}"), unsafe_allow_html=True)
+            ssl_details = f"Issuer: {data['ssl'].get('issuer', 'Unknown')}"
+            if data['ssl'].get('protocol'):
+                ssl_details += f" · {data['ssl']['protocol']} · {data['ssl']['key_type']} {data['ssl']['key_bits']} bits"
+            st.markdown(get_row_html("Chiffrement SSL/TLS", data['ssl']['status'], ssl_details), unsafe_allow_html=True)
             st.markdown(get_row_html("Pare-feu (Ports)", len(data['open_ports'])==0, "Aucun port critique détecté" if not data['open_ports'] else f"Ports: {data['open_ports']}"), unsafe_allow_html=True)
-            st.markdown(get_row_html("Protection Email", data['email']['dmarc'], "Enregistrement DMARC présent" if data['email']['dmarc'] else "Risque d'usurpation"), unsafe_allow_html=True)
+            st.markdown(get_row_html("Protection Email", data['email']['dmarc'], email_details(data['email'])), unsafe_allow_html=True)
             details_headers = "Headers OK" if data['headers']['status'] else f"Manquant: {', '.join(data['headers']['missing'])}"
             st.markdown(get_row_html("Headers HTTP (HSTS/X-Frame)", data['headers']['status'], details_headers), unsafe_allow_html=True)
 
         with col_R:
             st.markdown("### Export")
             st.info("Le rapport client est prêt à être envoyé.")
-            # Appel de la fonction "hardcodée" (sans sous-fonction)
+            # Mémoïsé : pas de régénération à chaque rerun
             pdf_bytes = create_pdf_bytes(data, st.session_state['saved_author'])
-            st.download_button("📥 Télécharger PDF", data=pdf_bytes, file_name=f"Audit_{domain}.pdf", mime="application/pdf", use_container_width=True)
+            st.download_button("📥 Télécharger PDF", data=pdf_bytes, file_name=f"Audit_{data['domain']}.pdf", mime="application/pdf", use_container_width=True)
+
+elif menu == "Surface d'attaque":
+    st.title("🌐 Surface d'attaque")
+    st.markdown("Découverte des sous-domaines exposés puis audit de chacun (ports et certificat mutualisés par IP).")
+    with st.form("surface_form"):
+        col_domain, col_profile = st.columns([3, 1])
+        with col_domain:
+            surface_domain = st.text_input("Domaine", placeholder="ex: mon-client.com", label_visibility="collapsed")
+        with col_profile:
+            surface_profile = st.selectbox("Profil de ports", list(PORT_PROFILES), label_visibility="collapsed")
+        surface_submitted = st.form_submit_button("Découvrir et auditer ✨", type="primary")
+
+    owner = st.session_state.get("username", "Expert")
+    if surface_submitted and surface_domain:
+        # Découverte et audits en arrière-plan (workers des jobs) : un rerun ou un changement de page ne les coupe pas
+        st.session_state['surface_job'] = job_queue.submit(owner, [surface_domain], kind="surface", port_profile=surface_profile)
+
+    surface_jobs = job_queue.list_jobs(owner, limit=1, kind="surface")
+    last_job = surface_jobs[0] if surface_jobs else None
+    # Audit lancé dans cette session et terminé : ses hôtes sont comptés une seule fois
+    if last_job and last_job['id'] == st.session_state.get('surface_job') and last_job['status'] in ("done", "failed"):
+        del st.session_state['surface_job']
+        if last_job['result']:
+            st.session_state['scan_count'] += len(last_job['result']['hosts'])
+            render_vip_stats(vip_placeholder)
+    surface_active = last_job is not None and last_job['status'] in ("queued", "running")
+
+    # Rafraîchissement automatique tant que la dernière surface est en attente ou en cours
+    @st.fragment(run_every=2 if surface_active else None)
+    def surface_panel():
+        jobs = job_queue.list_jobs(owner, limit=1, kind="surface")
+        if not jobs:
+            return
+        job = jobs[0]
+        if job['status'] in ("queued", "running"):
+            st.info(f"{JOB_STATUS[job['status']]} — découverte et audit des sous-domaines de {job['domains'][0]}...")
+        elif surface_active:
+            # Terminé depuis le dernier passage complet : compteur à jour et fin du rafraîchissement
+            st.rerun()
+        elif job['error']:
+            st.error(job['error'])
+        elif job['result']:
+            render_surface(job['result'])
+
+    surface_panel()
+
+elif menu == "Audit en masse":
+    st.title("📂 Audit en masse")
+    st.markdown("Importez un fichier CSV ou TXT avec un domaine par ligne (première colonne).")
+    with st.form("batch_form"):
+        uploaded = st.file_uploader("Fichier de domaines", type=["csv", "txt"], label_visibility="collapsed")
+        batch_profile = st.selectbox("Profil de ports", list(PORT_PROFILES))
+        batch_force_refresh = st.checkbox("Forcer l'actualisation (ignorer le cache)")
+        batch_submitted = st.form_submit_button("Lancer l'audit en masse ✨", type="primary")
+
+    owner = st.session_state.get("username", "Expert")
+    if batch_submitted and uploaded:
+        domains = list(read_domains_file(uploaded))
+        if not domains:
+            st.warning("Aucun domaine trouvé dans le fichier.")
+        else:
+            # Le job tourne en arrière-plan : on peut quitter la page sans l'interrompre
+            job_id = job_queue.submit(owner, domains, port_profile=batch_profile, force_refresh=batch_force_refresh)
+            st.success(f"Audit en masse #{job_id} mis en file d'attente ({len(domains)} domaines).")
+            st.session_state['scan_count'] += len(domains)
+            render_vip_stats(vip_placeholder)
+
+    st.markdown("### Mes audits en masse")
+    jobs = job_queue.list_jobs(owner)
+    # Rafraîchissement automatique tant qu'un job est en attente ou en cours
+    active = any(job['status'] in ("queued", "running") for job in jobs)
+
+    @st.fragment(run_every=2 if active else None)
+    def jobs_panel():
+        render_jobs(job_queue.list_jobs(owner))
+
+    jobs_panel()
+
+elif menu == "Surveillance":
+    st.title("🛰️ Surveillance")
+    st.markdown("Les domaines surveillés sont ré-audités automatiquement ; seuls les changements sont enregistrés.")
+    owner = st.session_state.get("username", "Expert")
+    intervals = {"Toutes les heures": 3600, "Tous les jours": 86400, "Toutes les semaines": 7 * 86400}
+    with st.form("watch_form", clear_on_submit=True):
+        col_domain, col_interval = st.columns([3, 1])
+        with col_domain:
+            watch_domain = st.text_input("Domaine", placeholder="ex: mon-client.com", label_visibility="collapsed")
+        with col_interval:
+            watch_interval = st.selectbox("Fréquence", list(intervals), index=1, label_visibility="collapsed")
+        if st.form_submit_button("Surveiller ✨", type="primary") and watch_domain:
+            st.success(f"{scheduler.watch(watch_domain, owner, intervals[watch_interval])} ajouté à la surveillance.")
+
+    watched = scheduler.list_watched(owner)
+    if watched:
+        df = pd.DataFrame([
+            {
+                "domain": w['domain'],
+                "score": w['last_result']['score'] if w['last_result'] else None,
+                "dernier audit": datetime.datetime.fromtimestamp(w['last_run']).strftime('%d/%m/%Y %H:%M') if w['last_run'] else "en attente",
+                "prochain audit": datetime.datetime.fromtimestamp(w['next_run']).strftime('%d/%m/%Y %H:%M'),
+            }
+            for w in watched
+        ])
+        st.dataframe(df, use_container_width=True, hide_index=True)
+        to_remove = st.selectbox("Retirer un domaine", [""] + [w['domain'] for w in watched])
+        if to_remove and st.button("Retirer de la surveillance"):
+            scheduler.unwatch(to_remove, owner)
+            st.rerun()
+
+        st.markdown("### Alertes récentes")
+        diffs = scheduler.recent_diffs(owner)
+        if diffs:
+            st.dataframe(pd.DataFrame([
+                {"date": datetime.datetime.fromtimestamp(d['detected_at']).strftime('%d/%m/%Y %H:%M'), "domain": d['domain'], "changement": d['kind'], "détail": d['detail']}
+                for d in diffs
+            ]), use_container_width=True, hide_index=True)
+        else:
+            st.info("Aucun changement détecté pour l'instant.")
+    else:
+        st.info("Aucun domaine surveillé.")
 
 elif menu == "Mes Rapports":
     st.title("Historique")
-    if st.session_state['history']:
-        df = pd.DataFrame(st.session_state['history'])
-        st.dataframe(df[['domain', 'score']], use_container_width=True)
+    owner = st.session_state.get("username", "Expert")
+    page_size = 25
+    domain_filter = st.text_input("Filtrer par domaine", placeholder="ex: mon-client.com").strip().lower() or None
+    total = scan_store.count_scans(domain_filter, owner=owner)
+    if total:
+        nb_pages = (total - 1) // page_size + 1
+        page = st.number_input(f"Page (sur {nb_pages})", min_value=1, max_value=nb_pages, value=1) - 1
+        # Seule la page affichée est chargée depuis la base
+        rows = scan_store.fetch_page(page, page_size, domain_filter, owner=owner)
+        df = pd.DataFrame([
+            {"date": datetime.datetime.fromtimestamp(r['scanned_at']).strftime('%d/%m/%Y %H:%M'), "domain": r['domain'], "score": r['score']}
+            for r in rows
+        ])
+        st.dataframe(df, use_container_width=True, hide_index=True)
+        st.caption(f"{total} audits enregistrés")
+
+        # Portefeuille : dernier audit de chaque domaine, scoré et agrégé en une passe
+        st.markdown("### 📊 Analyse du portefeuille")
+        with st.expander("Pondération du score"):
+            weight_cols = st.columns(len(SCORE_WEIGHTS))
+            weights = {
+                name: col.number_input(name, min_value=0, max_value=100, value=default, key=f"weight_{name}")
+                for col, (name, default) in zip(weight_cols, SCORE_WEIGHTS.items())
+            }
+        latest_id = scan_store.latest_id(owner)
+        portfolio = load_portfolio(owner, latest_id)
+        scores = score_portfolio(owner, latest_id, tuple(sorted(weights.items())))
+        col_dist, col_ports = st.columns(2)
+        with col_dist:
+            st.markdown("**Répartition des scores**")
+            st.bar_chart(analytics.score_distribution(scores))
+        with col_ports:
+            st.markdown("**Exposition des ports**")
+            exposure = analytics.port_exposure(portfolio)
+            if exposure.empty:
+                st.success("Aucun port critique exposé.")
+            else:
+                st.bar_chart(exposure.set_axis(exposure.index.astype(str)))
+        st.markdown("**Domaines les plus exposés**")
+        st.dataframe(analytics.worst_offenders(portfolio, scores), use_container_width=True, hide_index=True)
+        expiry_days = st.slider("Certificats expirant sous (jours)", min_value=1, max_value=90, value=30)
+        expiring = analytics.expiring_certificates(portfolio, expiry_days)
+        if expiring.empty:
+            st.info(f"Aucun certificat n'expire dans les {expiry_days} prochains jours.")
+        else:
+            st.dataframe(expiring, use_container_width=True, hide_index=True)
     else:
         st.info("Aucun audit récent.")
 
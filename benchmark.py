@@ -0,0 +1,359 @@
+"""Benchmark des checks CyberAudit contre une ferme de cibles locales (loopback).
+
+Lance, dans un processus séparé : un serveur DNS bouchon (A + TXT _dmarc), un serveur
+HTTPS avec certificat généré et headers/latence configurables, des ports ouverts,
+fermés et filtrés.
+Mesure la latence par check, la latence d'un audit complet et le débit en masse,
+puis écrit le tout en JSON.
+
+    python benchmark.py --iterations 20 --output bench.json
+"""
+import argparse
+import datetime
+import http.server
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import socketserver
+import ssl
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+
+import ratelimit
+import scanner_logic
+
+BENCH_ZONE = "bench.test"
+
+# --- CERTIFICATS ---
+def generate_certificates(directory):
+    # Une AC de test et un certificat serveur pour *.bench.test signé par elle
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import ExtendedKeyUsageOID, NameOID
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    ca_key = ec.generate_private_key(ec.SECP256R1())
+    ca_name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "CyberAudit Bench CA")])
+    ca_cert = (
+        x509.CertificateBuilder()
+        .subject_name(ca_name).issuer_name(ca_name)
+        .public_key(ca_key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=365))
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .add_extension(x509.KeyUsage(False, False, False, False, False, True, True, False, False), critical=True)
+        .add_extension(x509.SubjectKeyIdentifier.from_public_key(ca_key.public_key()), critical=False)
+        .sign(ca_key, hashes.SHA256())
+    )
+    key = ec.generate_private_key(ec.SECP256R1())
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, BENCH_ZONE)]))
+        .issuer_name(ca_name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=90))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName(BENCH_ZONE), x509.DNSName(f"*.{BENCH_ZONE}")]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=True)
+        .add_extension(x509.KeyUsage(True, False, False, False, False, False, False, False, False), critical=True)
+        .add_extension(x509.ExtendedKeyUsage([ExtendedKeyUsageOID.SERVER_AUTH]), critical=False)
+        .add_extension(x509.AuthorityKeyIdentifier.from_issuer_public_key(ca_key.public_key()), critical=False)
+        .sign(ca_key, hashes.SHA256())
+    )
+    paths = {name: os.path.join(directory, f"{name}.pem") for name in ("ca", "cert", "key")}
+    with open(paths["ca"], "wb") as f:
+        f.write(ca_cert.public_bytes(serialization.Encoding.PEM))
+    with open(paths["cert"], "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(paths["key"], "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    return paths
+
+# --- SERVEURS BOUCHONS ---
+class StubDNSHandler(socketserver.BaseRequestHandler):
+    # A 127.0.0.1 pour toute la zone de bench, TXT selon server.txt_records, NXDOMAIN sinon
+    def handle(self):
+        data, sock = self.request
+        query = dns.message.from_wire(data)
+        response = dns.message.make_response(query)
+        question = query.question[0]
+        name = question.name.to_text().rstrip(".").lower()
+        if not (name == BENCH_ZONE or name.endswith("." + BENCH_ZONE)):
+            response.set_rcode(dns.rcode.NXDOMAIN)
+        elif question.rdtype == dns.rdatatype.A:
+            response.answer.append(dns.rrset.from_text(question.name, 300, "IN", "A", "127.0.0.1"))
+        elif question.rdtype == dns.rdatatype.TXT:
+            label = name.split(".")[0]
+            if label in self.server.txt_records:
+                response.answer.append(dns.rrset.from_text(question.name, 300, "IN", "TXT", f'"{self.server.txt_records[label]}"'))
+        sock.sendto(response.to_wire(), self.client_address)
+
+class StubDNSServer(socketserver.ThreadingUDPServer):
+    daemon_threads = True
+
+    def __init__(self, txt_records):
+        super().__init__(("127.0.0.1", 0), StubDNSHandler)
+        self.txt_records = txt_records
+
+class BenchHTTPHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        for name, value in self.server.response_headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_GET = do_HEAD
+
+    def log_message(self, *args):
+        pass
+
+class BenchHTTPSServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, certificates, response_headers, latency):
+        super().__init__(("127.0.0.1", 0), BenchHTTPHandler)
+        self.response_headers = response_headers
+        self.latency = latency
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(certificates["cert"], certificates["key"])
+
+    def finish_request(self, request, client_address):
+        # Poignée de main TLS dans le thread de la connexion : accept() reste en TCP simple,
+        # sinon chaque handshake bloquerait la boucle d'acceptation et les connexions seraient sérialisées
+        tls = self.context.wrap_socket(request, server_side=True)
+        try:
+            super().finish_request(tls, client_address)
+        finally:
+            self.shutdown_request(tls)
+
+class PortFarm:
+    # Ports ouverts (écoute), fermés (RST) et filtrés (file d'attente pleine : SYN ignorés)
+    def __init__(self, nb_open=2, nb_closed=2, nb_filtered=1):
+        self._sockets = []
+        self.open = [self._listen().getsockname()[1] for _ in range(nb_open)]
+        self.closed = []
+        for _ in range(nb_closed):
+            sock = socket.socket()
+            sock.bind(("127.0.0.1", 0))
+            self.closed.append(sock.getsockname()[1])
+            sock.close()
+        self.filtered = [self._filtered_port() for _ in range(nb_filtered)]
+
+    def _listen(self, backlog=128):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        sock.listen(backlog)
+        self._sockets.append(sock)
+        return sock
+
+    def _filtered_port(self):
+        server = self._listen(backlog=0)
+        port = server.getsockname()[1]
+        # On remplit la file d'attente sans jamais accepter : les connexions suivantes expirent
+        while True:
+            client = socket.socket()
+            client.settimeout(0.2)
+            try:
+                client.connect(("127.0.0.1", port))
+            except OSError:
+                client.close()
+                return port
+            self._sockets.append(client)
+
+    def layout(self):
+        return {"open": self.open, "closed": self.closed, "filtered": self.filtered}
+
+    def close(self):
+        for sock in self._sockets:
+            sock.close()
+
+class FarmPorts:
+    # Ports de la PortFarm du processus de la ferme, vus depuis le processus mesuré
+    def __init__(self, open, closed, filtered):
+        self.open = open
+        self.closed = closed
+        self.filtered = filtered
+
+    @property
+    def ports(self):
+        return self.open + self.closed + self.filtered
+
+def _serve_farm(conn, certificates, response_headers, http_latency, dmarc):
+    # Processus de la ferme : envoie ses ports au parent puis sert jusqu'au message d'arrêt
+    dns_server = StubDNSServer({"_dmarc": dmarc})
+    https = BenchHTTPSServer(certificates, response_headers, http_latency)
+    ports = PortFarm()
+    for server in (dns_server, https):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    conn.send({"dns_port": dns_server.server_address[1], "https_port": https.server_address[1], "ports": ports.layout()})
+    try:
+        conn.recv()
+    except EOFError:
+        pass
+    for server in (dns_server, https):
+        server.shutdown()
+        server.server_close()
+    ports.close()
+
+class TargetFarm:
+    # Les serveurs tournent dans un autre processus : ils ne prennent ni le GIL ni le temps CPU
+    # attribué au scanner mesuré, le débit en masse reflète donc la concurrence du scanner
+    def __init__(self, http_latency=0.0, response_headers=None, dmarc="v=DMARC1; p=reject"):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.certificates = generate_certificates(self._tmp.name)
+        if response_headers is None:
+            response_headers = {"Strict-Transport-Security": "max-age=31536000", "X-Frame-Options": "DENY"}
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(
+            target=_serve_farm, args=(child_conn, self.certificates, response_headers, http_latency, dmarc), daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+        info = self._conn.recv()
+        self.dns_port = info["dns_port"]
+        self.https_port = info["https_port"]
+        self.ports = FarmPorts(**info["ports"])
+
+    def configure_scanner(self):
+        # Redirige le scanner vers la ferme locale
+        scanner_logic.DNS_NAMESERVERS = ["127.0.0.1"]
+        scanner_logic.DNS_PORT = self.dns_port
+        scanner_logic.HTTPS_PORT = self.https_port
+        scanner_logic.TLS_CAFILE = self.certificates["ca"]
+        scanner_logic.reset_clients()
+        # Toutes les cibles sont sur 127.0.0.1 : seule la limite globale a un sens ici
+        ratelimit.LIMITER.configure(per_ip=None, per_subnet=None)
+
+    def close(self):
+        self._conn.send("stop")
+        self._conn.close()
+        self._process.join(5)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._tmp.cleanup()
+
+# --- MESURES ---
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "p50_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+def measure(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def bench_checks(farm, iterations):
+    domain = BENCH_ZONE
+    resolution = scanner_logic.resolve_target(domain, force_refresh=True)
+    return {
+        "resolve_target": measure(lambda: scanner_logic.resolve_target(domain, force_refresh=True), iterations),
+        "check_ssl": measure(lambda: scanner_logic.check_ssl(domain, force_refresh=True, resolution=resolution), iterations),
+        "check_ports_open_closed": measure(
+            lambda: scanner_logic.check_ports(domain, farm.ports.open + farm.ports.closed, force_refresh=True, resolution=resolution), iterations
+        ),
+        "check_ports_with_filtered": measure(
+            lambda: scanner_logic.check_ports(domain, farm.ports.ports, force_refresh=True, resolution=resolution), iterations
+        ),
+        "check_email_security": measure(lambda: scanner_logic.check_email_security(domain, force_refresh=True), iterations),
+        "check_security_headers": measure(lambda: scanner_logic.check_security_headers(domain, force_refresh=True, resolution=resolution), iterations),
+    }
+
+def bench_full_scan(farm, iterations):
+    ports = farm.ports.open + farm.ports.closed
+    return {
+        "cold": measure(lambda: scanner_logic.run_full_scan(BENCH_ZONE, port_profile=ports, force_refresh=True), iterations),
+        "warm": measure(lambda: scanner_logic.run_full_scan(BENCH_ZONE, port_profile=ports), iterations),
+    }
+
+def bench_batch(farm, nb_domains, concurrency_levels):
+    ports = farm.ports.open + farm.ports.closed
+    results = []
+    for workers in concurrency_levels:
+        domains = [f"client{i}.{BENCH_ZONE}" for i in range(nb_domains)]
+        start = time.perf_counter()
+        # Toute la ferme est un seul hôte : la limite par hôte est alignée sur la concurrence globale
+        count = sum(1 for _ in scanner_logic.scan_batch(domains, max_workers=workers, per_host=workers, port_profile=ports, force_refresh=True))
+        elapsed = time.perf_counter() - start
+        results.append({
+            "workers": workers,
+            "domains": count,
+            "seconds": round(elapsed, 3),
+            "domains_per_second": round(count / elapsed, 2),
+        })
+    return results
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CyberAudit sur cibles locales")
+    parser.add_argument("--iterations", type=int, default=20, help="répétitions par mesure")
+    parser.add_argument("--batch-size", type=int, default=200, help="nombre de domaines pour le débit en masse")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="niveaux de concurrence du mode masse")
+    parser.add_argument("--http-latency", type=float, default=0.0, help="latence HTTP simulée (secondes)")
+    parser.add_argument("--output", help="fichier JSON de sortie (stdout par défaut)")
+    args = parser.parse_args()
+
+    farm = TargetFarm(http_latency=args.http_latency)
+    try:
+        farm.configure_scanner()
+        report = {
+            "meta": {
+                "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                # La ferme tourne dans son propre processus : sur une seule CPU elle partage encore le processeur
+                "cpu_count": os.cpu_count(),
+                "iterations": args.iterations,
+                "http_latency": args.http_latency,
+                "ports": {"open": farm.ports.open, "closed": farm.ports.closed, "filtered": farm.ports.filtered},
+            },
+            "checks": bench_checks(farm, args.iterations),
+            "full_scan": bench_full_scan(farm, args.iterations),
+            "batch": bench_batch(farm, args.batch_size, [int(c) for c in args.concurrency.split(",")]),
+        }
+    finally:
+        farm.close()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import argparse
+import contextlib
+import csv
+import json
+import sys
+
+from scanner_logic import BATCH_WORKERS, PORT_PROFILES, SCAN_DEADLINE, scan_batch
+
+# Audit sans Streamlit (cron, CI) :
+#   python cli.py exemple.com
+#   python cli.py --file domaines.csv --format csv --concurrency 32
+#   cat domaines.txt | python cli.py -
+#   python cli.py --discover exemple.com   (sous-domaines inclus, un rapport de surface par domaine)
+
+CSV_FIELDS = (
+    "domain", "score", "ssl_status", "ssl_days_left", "ssl_issuer",
+    "open_ports", "dmarc", "headers_status", "hsts", "headers_missing", "errors",
+)
+
+def read_domains(lines):
+    # Même règle que l'import de l'application : première colonne, lignes sans point ignorées
+    for row in csv.reader(lines):
+        if row and "." in row[0] and not row[0].lstrip().startswith("#"):
+            yield row[0].strip()
+
+def _csv_row(result):
+    return {
+        "domain": result["domain"],
+        "score": result["score"],
+        "ssl_status": int(result["ssl"]["status"]),
+        "ssl_days_left": result["ssl"].get("days_left", 0),
+        "ssl_issuer": result["ssl"].get("issuer", ""),
+        "open_ports": " ".join(str(p) for p in result["open_ports"]),
+        "dmarc": int(result["email"]["dmarc"]),
+        "headers_status": int(result["headers"]["status"]),
+        "hsts": int(result["headers"]["hsts"]),
+        "headers_missing": " ".join(result["headers"]["missing"]),
+        "errors": " ".join(f"{check}:{error}" for check, error in result["errors"].items()),
+    }
+
+def _iter_surfaces(domains, args, out, writer):
+    # --discover : un rapport de surface par domaine (NDJSON), puis chacun de ses hôtes
+    from discovery import audit_surface, load_wordlist
+    words = load_wordlist(args.wordlist) if args.wordlist else None
+    for domain in dict.fromkeys(domains):
+        surface = audit_surface(
+            domain, words, port_profile=args.ports, force_refresh=args.force_refresh, max_workers=args.concurrency,
+            deadline=args.deadline, per_host=args.per_host,
+        )
+        if writer is None:
+            out.write(json.dumps(surface, default=str, ensure_ascii=False) + "\n")
+        yield from surface["hosts"]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audit CyberAudit en ligne de commande")
+    parser.add_argument("domains", nargs="*", help="domaines à auditer ('-' pour lire l'entrée standard)")
+    parser.add_argument("--file", "-f", help="fichier CSV/TXT avec un domaine par ligne (première colonne)")
+    parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson", help="format de sortie")
+    parser.add_argument("--output", "-o", help="fichier de sortie (stdout par défaut)")
+    parser.add_argument("--concurrency", "-c", type=int, default=BATCH_WORKERS, help="audits simultanés")
+    parser.add_argument("--per-host", type=int, default=1, help="audits simultanés par IP résolue")
+    parser.add_argument("--rate-per-ip", type=float, help="connexions max par seconde vers une même IP")
+    parser.add_argument("--ports", choices=list(PORT_PROFILES), default="critical", help="profil de ports")
+    parser.add_argument("--deadline", type=float, default=SCAN_DEADLINE, help="délai max d'un audit (secondes)")
+    parser.add_argument("--force-refresh", action="store_true", help="ignorer le cache")
+    parser.add_argument("--discover", action="store_true", help="découvrir et auditer les sous-domaines")
+    parser.add_argument("--wordlist", help="liste de sous-domaines pour --discover (subdomains.txt par défaut)")
+    parser.add_argument("--save", action="store_true", help="enregistrer les résultats dans l'historique")
+    parser.add_argument("--owner", default="cli", help="utilisateur à qui rattacher les audits enregistrés (--save)")
+    parser.add_argument("--min-score", type=int, help="code de sortie 1 si un domaine a un score inférieur")
+    args = parser.parse_args(argv)
+
+    # Fichiers d'entrée et de sortie lus/écrits au fil des audits : fermés à la fin, même sur erreur
+    with contextlib.ExitStack() as files:
+        sources = []
+        if args.file:
+            sources.append(read_domains(files.enter_context(open(args.file, encoding="utf-8", errors="ignore"))))
+        for domain in args.domains:
+            sources.append(read_domains(sys.stdin) if domain == "-" else [domain])
+        if not sources:
+            parser.error("aucun domaine (argument, --file ou '-')")
+
+        def all_domains():
+            for source in sources:
+                yield from source
+
+        if args.rate_per_ip:
+            # Rafale = une seconde de débit
+            from ratelimit import LIMITER
+            LIMITER.configure(per_ip=(args.rate_per_ip, max(1, args.rate_per_ip)))
+
+        store = None
+        if args.save:
+            from scan_store import ScanStore
+            store = ScanStore()
+
+        out = files.enter_context(open(args.output, "w", newline="")) if args.output else sys.stdout
+        writer = None
+        if args.format == "csv":
+            writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+        failed = False
+        if args.discover:
+            results = _iter_surfaces(all_domains(), args, out, writer)
+        else:
+            results = scan_batch(
+                all_domains(), max_workers=args.concurrency, per_host=args.per_host,
+                deadline=args.deadline, port_profile=args.ports, force_refresh=args.force_refresh,
+            )
+        # Chaque résultat est écrit dès qu'il arrive : la sortie peut être lue en flux
+        for result in results:
+            if writer:
+                writer.writerow(_csv_row(result))
+            elif not args.discover:
+                out.write(json.dumps(result, default=str, ensure_ascii=False) + "\n")
+            out.flush()
+            if store:
+                store.save_scan(result, owner=args.owner)
+            if args.min_score is not None and result["score"] < args.min_score:
+                failed = True
+        return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
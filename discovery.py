@@ -0,0 +1,163 @@
+import asyncio
+import os
+import secrets
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from scanner_logic import (
+    BATCH_WORKERS, SCAN_DEADLINE, check_email_security, host_key, normalize_domain, query_dns, resolve_target_async,
+    run_full_scan,
+)
+
+# Découverte des sous-domaines d'un client à partir d'une liste de noms courants,
+# puis audit de toute la surface exposée en mutualisant les checks par IP
+WORDLIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "subdomains.txt")
+# Requêtes DNS simultanées pendant l'énumération (le débit reste borné par ratelimit.DNS_RATE)
+DISCOVERY_CONCURRENCY = 256
+# Nombre max d'hôtes audités par domaine
+MAX_HOSTS = 200
+
+def load_wordlist(path=WORDLIST_PATH):
+    with open(path, encoding="utf-8") as f:
+        words = (line.strip().lower() for line in f)
+        return list(dict.fromkeys(w for w in words if w and not w.startswith("#")))
+
+async def _lookup(name, semaphore, force_refresh):
+    async with semaphore:
+        answer = await query_dns(name, "A", force_refresh)
+    return set(answer[0]) if answer else set()
+
+async def _discover_async(domain, words, force_refresh):
+    semaphore = asyncio.Semaphore(DISCOVERY_CONCURRENCY)
+    # Les noms que normalize_domain réécrit (www.) sont déjà couverts par le domaine lui-même
+    names = [name for name in (f"{word}.{domain}" for word in words) if normalize_domain(name) == name]
+    # DNS joker (*.domaine) : un label aléatoire qui résout trahit les faux positifs
+    probe = f"{secrets.token_hex(8)}.{domain}"
+    answers = await asyncio.gather(*(_lookup(name, semaphore, force_refresh) for name in [probe] + names))
+    wildcard = answers[0]
+    found = [domain] + [name for name, addresses in zip(names, answers[1:]) if addresses and addresses != wildcard]
+    # Résolution complète (A/AAAA, repli système) des seuls noms trouvés
+    resolutions = await asyncio.gather(*(resolve_target_async(name, force_refresh) for name in found[:MAX_HOSTS]))
+    return {
+        "wildcard": sorted(wildcard),
+        "hosts": {r["domain"]: r for r in resolutions if r["addresses"]},
+    }
+
+def discover_subdomains(domain, words=None, force_refresh=False):
+    # {"wildcard": [ips], "hosts": {nom: résolution}} ; le domaine lui-même est toujours inclus
+    domain = normalize_domain(domain)
+    return asyncio.run(_discover_async(domain, load_wordlist() if words is None else words, force_refresh))
+
+def _cert_covers(sans, name):
+    # Le certificat présenté vaut aussi pour ce nom (SAN exact ou joker sur un seul label)
+    for san in sans or ():
+        san = san.lower()
+        if san == name or (san.startswith("*.") and name.split(".", 1)[-1] == san[2:]):
+            return True
+    return False
+
+def _group_by_ip(hosts):
+    groups = {}
+    for name, resolution in hosts.items():
+        groups.setdefault(tuple(sorted(resolution["addresses"])), []).append(name)
+    return groups
+
+def _inherit_dmarc(email, parent_domain, parent_email):
+    # Sans DMARC propre, un sous-domaine est couvert par celui du domaine organisationnel
+    # (sp=, sinon p=) ; SPF, MX, DKIM, MTA-STS et TLS-RPT restent ceux de l'hôte
+    if email["dmarc"] or "error" in email or not parent_email.get("dmarc"):
+        return email
+    policy = parent_email.get("dmarc_subdomain_policy") or parent_email.get("dmarc_policy")
+    return dict(email, dmarc=True, dmarc_policy=policy, dmarc_inherited_from=parent_domain)
+
+def _scan_host(name, options, parent_domain, parent_email):
+    # Email vérifié sur l'hôte lui-même (celui du domaine est déjà connu), puis audit complet
+    if parent_email is not None:
+        email = parent_email
+        if name != parent_domain:
+            email = _inherit_dmarc(
+                check_email_security(name, options["force_refresh"], options["resolution"]), parent_domain, parent_email,
+            )
+        options = dict(options, reuse=dict(options.get("reuse", {}), email=email))
+    return run_full_scan(name, **options)
+
+def _scan_all(jobs, max_workers, parent_domain, parent_email, per_host=None):
+    # jobs : [(nom, options de run_full_scan)], audités en parallèle, au plus per_host à la fois par IP
+    # (None = sans limite) ; un hôte saturé ne bloque pas les suivants, il reste en attente
+    reports = {}
+    waiting = deque(jobs)
+    running = {}
+    host_load = Counter()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="surface") as executor:
+        while waiting or running:
+            for _ in range(len(waiting)):
+                if len(running) >= max_workers:
+                    break
+                name, options = waiting.popleft()
+                host = host_key(options["resolution"])
+                if per_host and host_load[host] >= per_host:
+                    waiting.append((name, options))
+                    continue
+                host_load[host] += 1
+                running[executor.submit(_scan_host, name, options, parent_domain, parent_email)] = (name, host)
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, host = running.pop(future)
+                host_load[host] -= 1
+                reports[name] = future.result()
+    return reports
+
+def audit_surface(domain, words=None, port_profile="critical", force_refresh=False, max_workers=BATCH_WORKERS,
+                  deadline=SCAN_DEADLINE, per_host=None):
+    # 1. un hôte par groupe d'IP (plus le domaine lui-même) est audité complètement ;
+    # 2. les autres réutilisent les ports de leur IP et le certificat si ses SAN les couvrent :
+    #    headers et email sont refaits (seul DMARC est hérité du domaine, cf. _inherit_dmarc)
+    start = time.perf_counter()
+    domain = normalize_domain(domain)
+    words = load_wordlist() if words is None else words
+    discovery = discover_subdomains(domain, words, force_refresh)
+    hosts = discovery["hosts"]
+    groups = _group_by_ip(hosts)
+    options = {"port_profile": port_profile, "force_refresh": force_refresh, "deadline": deadline}
+    # Email du domaine d'abord : les sous-domaines sans DMARC héritent du sien
+    parent_email = None
+    if domain in hosts:
+        parent_email = check_email_security(domain, force_refresh, hosts[domain])
+
+    leaders = {domain} if domain in hosts else set()
+    for names in groups.values():
+        if not leaders & set(names):
+            leaders.add(names[0])
+    reports = _scan_all(
+        [(name, dict(options, resolution=hosts[name])) for name in leaders], max_workers, domain, parent_email, per_host,
+    )
+
+    followers = []
+    for names in groups.values():
+        leader = reports[next(name for name in names if name in leaders)]
+        for name in names:
+            if name in leaders:
+                continue
+            reuse = {"open_ports": leader["open_ports"]}
+            if leader["ssl"]["status"] and _cert_covers(leader["ssl"].get("sans"), name):
+                reuse["ssl"] = leader["ssl"]
+            followers.append((name, dict(options, resolution=hosts[name], reuse=reuse)))
+    reports.update(_scan_all(followers, max_workers, domain, parent_email, per_host))
+
+    host_reports = []
+    for name in sorted(reports, key=lambda n: (n != domain, n)):
+        report = reports[name]
+        report["addresses"] = hosts[name]["addresses"]
+        host_reports.append(report)
+    return {
+        "domain": domain,
+        "candidates": len(words),
+        "wildcard": discovery["wildcard"],
+        "hosts": host_reports,
+        "ips": {", ".join(ips): names for ips, names in groups.items()},
+        # Le maillon le plus faible donne le score de la surface
+        "score": min((r["score"] for r in host_reports), default=0),
+        "open_ports": sorted({p for r in host_reports for p in r["open_ports"]}),
+        "duration": round(time.perf_counter() - start, 3),
+    }
@@ -0,0 +1,227 @@
+import json
+import sqlite3
+import threading
+import time
+
+from discovery import audit_surface
+from scan_store import DB_PATH
+from scanner_logic import normalize_domain, scan_batch
+
+# File d'attente des audits en masse, dans la même base SQLite que l'historique
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    owner TEXT NOT NULL,
+    status TEXT NOT NULL,
+    domains TEXT NOT NULL,
+    options TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    error TEXT,
+    -- batch : audit de chaque domaine ; surface : découverte et audit des sous-domaines (résumé dans result)
+    kind TEXT NOT NULL DEFAULT 'batch',
+    result TEXT,
+    -- Découpage en paquets : prochain domaine à distribuer, paquets en cours, dernier paquet pris
+    next_index INTEGER NOT NULL DEFAULT 0,
+    inflight INTEGER NOT NULL DEFAULT 0,
+    last_claim_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_owner ON jobs (owner, created_at DESC);
+"""
+
+# Nombre de paquets traités en parallèle par le process
+JOB_WORKERS = 2
+# Les workers prennent les jobs par paquets de domaines (enregistrés en une transaction) :
+# un gros job n'accapare pas un worker, les utilisateurs sont servis à tour de rôle
+JOB_CHUNK = 50
+# Au sein d'un paquet, les résultats sont enregistrés (et comptés dans done) par petits lots :
+# tous les JOB_SAVE_EVERY audits ou toutes les JOB_SAVE_INTERVAL secondes
+JOB_SAVE_EVERY = 10
+JOB_SAVE_INTERVAL = 2.0
+POLL_INTERVAL = 1.0
+
+class JobQueue:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def submit(self, owner, domains, kind="batch", **options):
+        # Domaines normalisés et dédoublonnés (l'ordre est conservé)
+        domains = list(dict.fromkeys(d for d in map(normalize_domain, domains) if d))
+        # Job vide : aucun paquet à distribuer, il est terminé d'emblée
+        now = time.time()
+        cursor = self._connection().execute(
+            "INSERT INTO jobs (owner, kind, status, domains, options, total, created_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (owner, kind, "queued" if domains else "done", "\n".join(domains), json.dumps(options), len(domains), now,
+             None if domains else now),
+        )
+        return cursor.lastrowid
+
+    def get(self, job_id):
+        row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job(row) if row else None
+
+    def list_jobs(self, owner, limit=10, kind="batch"):
+        rows = self._connection().execute(
+            "SELECT * FROM jobs WHERE owner = ? AND kind = ? ORDER BY created_at DESC LIMIT ?", (owner, kind, limit)
+        )
+        return [_job(row) for row in rows]
+
+    def claim_chunk(self, size=JOB_CHUNK):
+        # Prochain paquet de domaines à auditer, (job, domaines) ou None.
+        # Équité entre utilisateurs : d'abord celui qui a le moins de paquets en cours,
+        # puis celui servi il y a le plus longtemps, puis le plus ancien job
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("""
+                SELECT j.* FROM jobs j
+                JOIN (SELECT owner, SUM(inflight) AS inflight, MAX(last_claim_at) AS last_claim FROM jobs GROUP BY owner) o
+                    ON o.owner = j.owner
+                WHERE j.status IN ('queued', 'running') AND j.next_index < j.total
+                ORDER BY o.inflight, COALESCE(o.last_claim, 0), j.created_at
+                LIMIT 1
+            """).fetchone()
+            if row is not None:
+                now = time.time()
+                conn.execute("""
+                    UPDATE jobs SET status = 'running', started_at = COALESCE(started_at, ?), next_index = next_index + ?,
+                        inflight = inflight + 1, last_claim_at = ?
+                    WHERE id = ?
+                """, (now, size, now, row["id"]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        job = _job(row)
+        return job, job["domains"][row["next_index"]:row["next_index"] + size]
+
+    def set_result(self, job_id, result):
+        self._connection().execute("UPDATE jobs SET result = ? WHERE id = ?", (json.dumps(result), job_id))
+
+    def add_done(self, job_id, count):
+        # Progression au fil de l'eau : audits enregistrés depuis le dernier lot
+        self._connection().execute("UPDATE jobs SET done = done + ? WHERE id = ?", (count, job_id))
+
+    def finish_chunk(self, job_id, error=None):
+        # Un paquet de moins en cours ; le job est terminé quand tout est distribué et revenu.
+        # Une erreur arrête le job : ses paquets restants ne sont plus distribués
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("UPDATE jobs SET inflight = inflight - 1 WHERE id = ?", (job_id,))
+            if error:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', finished_at = ?, error = ? WHERE id = ? AND status = 'running'",
+                    (now, error, job_id),
+                )
+            conn.execute("""
+                UPDATE jobs SET status = 'done', finished_at = ?
+                WHERE id = ? AND status = 'running' AND inflight = 0 AND next_index >= total
+            """, (now, job_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def requeue_interrupted(self):
+        # Jobs restés « running » après un arrêt du serveur : ils repartent en file depuis le début,
+        # les domaines déjà enregistrés sont sautés par le worker
+        self._connection().execute(
+            "UPDATE jobs SET status = 'queued', next_index = 0, inflight = 0 WHERE status = 'running'"
+        )
+
+def _job(row):
+    job = dict(row)
+    job["domains"] = job["domains"].split("\n") if job["domains"] else []
+    job["options"] = json.loads(job["options"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+class JobWorkers:
+    # Threads de fond indépendants des sessions Streamlit : quitter la page ne coupe pas un job
+    def __init__(self, queue, store, nb_workers=JOB_WORKERS):
+        self.queue = queue
+        self.store = store
+        self._stop = threading.Event()
+        queue.requeue_interrupted()
+        self._threads = [
+            threading.Thread(target=self._loop, daemon=True, name=f"job-worker-{i}") for i in range(nb_workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                worked = self._step()
+            except Exception as e:
+                # Base verrouillée, disque plein... : le worker survit et réessaie au tour suivant
+                print(f"--- JOB WORKER : {e!r} ---")
+                worked = False
+            if not worked:
+                self._stop.wait(POLL_INTERVAL)
+
+    def _step(self):
+        claim = self.queue.claim_chunk()
+        if claim is None:
+            return False
+        job, domains = claim
+        try:
+            self._run_chunk(job, domains)
+        except Exception as e:
+            self.queue.finish_chunk(job["id"], error=repr(e))
+        else:
+            self.queue.finish_chunk(job["id"])
+        return True
+
+    def _run_chunk(self, job, domains):
+        if job["kind"] == "surface":
+            return self._run_surface(job, domains)
+        # Reprise : les domaines déjà enregistrés pour ce job ne sont pas ré-audités.
+        # Les résultats sont enregistrés au fil de scan_batch, et ceux déjà rendus le sont même si le lot échoue
+        already_done = self.store.job_domains(job["id"], domains)
+        pending, last_save = [], time.monotonic()
+        try:
+            for result in scan_batch([d for d in domains if d not in already_done], **job["options"]):
+                pending.append(result)
+                if len(pending) >= JOB_SAVE_EVERY or time.monotonic() - last_save >= JOB_SAVE_INTERVAL:
+                    results, pending, last_save = pending, [], time.monotonic()
+                    self._save(job, results)
+        finally:
+            self._save(job, pending)
+
+    def _run_surface(self, job, domains):
+        # Un seul domaine par job ; résumé déjà enregistré = job interrompu juste avant la fin
+        if job["result"] is not None:
+            return
+        for domain in domains:
+            surface = audit_surface(domain, **job["options"])
+            self.store.save_scans(surface["hosts"], job["id"], job["owner"])
+            self.queue.set_result(job["id"], surface)
+            self.queue.add_done(job["id"], 1)
+
+    def _save(self, job, results):
+        if results:
+            self.queue.add_done(job["id"], self.store.save_scans(results, job["id"], job["owner"]))
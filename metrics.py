@@ -0,0 +1,142 @@
+import asyncio
+import cProfile
+import http.server
+import pstats
+import socket
+import ssl
+import threading
+from collections import Counter
+
+# Bornes des histogrammes de durée (secondes)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def classify_error(exc):
+    # timeout / refused / dns / tls / network / other, en remontant la chaîne des causes
+    name = type(exc).__name__
+    if isinstance(exc, (TimeoutError, socket.timeout, asyncio.TimeoutError)) or "Timeout" in name:
+        return "timeout"
+    if isinstance(exc, ConnectionRefusedError):
+        return "refused"
+    if isinstance(exc, (ssl.SSLError, ssl.CertificateError)) or name == "SSLError":
+        return "tls"
+    if isinstance(exc, socket.gaierror) or type(exc).__module__.startswith("dns."):
+        return "dns"
+    cause = exc.__cause__ or exc.__context__
+    if cause is not None and cause is not exc:
+        return classify_error(cause)
+    if isinstance(exc, OSError):
+        return "network"
+    return "other"
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.total += 1
+        self.sum += value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+
+class Registry:
+    # Agrégats partagés par tous les audits du process
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = {}            # étape -> Histogram
+        self.errors = Counter()        # (check, classe d'erreur) -> nombre
+        self.port_probes = Counter()   # open / refused / timeout / ...
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self.durations.setdefault(stage, Histogram()).observe(seconds)
+
+    def count_error(self, check, error_class):
+        with self._lock:
+            self.errors[(check, error_class)] += 1
+
+    def count_port_probe(self, outcome):
+        with self._lock:
+            self.port_probes[outcome] += 1
+
+    def render(self):
+        # Format texte Prometheus
+        with self._lock:
+            lines = [
+                "# HELP cyberaudit_stage_duration_seconds Durée de chaque étape d'un audit.",
+                "# TYPE cyberaudit_stage_duration_seconds histogram",
+            ]
+            for stage, hist in sorted(self.durations.items()):
+                for bound, count in zip(BUCKETS, hist.counts):
+                    lines.append(f'cyberaudit_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'cyberaudit_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist.total}')
+                lines.append(f'cyberaudit_stage_duration_seconds_sum{{stage="{stage}"}} {hist.sum:.6f}')
+                lines.append(f'cyberaudit_stage_duration_seconds_count{{stage="{stage}"}} {hist.total}')
+            lines += [
+                "# HELP cyberaudit_check_errors_total Échecs des checks par classe d'erreur.",
+                "# TYPE cyberaudit_check_errors_total counter",
+            ]
+            for (check, error_class), count in sorted(self.errors.items()):
+                lines.append(f'cyberaudit_check_errors_total{{check="{check}",error="{error_class}"}} {count}')
+            lines += [
+                "# HELP cyberaudit_port_probes_total Résultat des connexions du scan de ports.",
+                "# TYPE cyberaudit_port_probes_total counter",
+            ]
+            for outcome, count in sorted(self.port_probes.items()):
+                lines.append(f'cyberaudit_port_probes_total{{outcome="{outcome}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# --- ENDPOINT /metrics ---
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_metrics_server(port, host="0.0.0.0"):
+    server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
+
+# --- PROFILAGE cProfile PAR AUDIT ---
+# Depuis Python 3.12, un seul cProfile peut être actif à la fois dans le process
+# ("Another profiling tool is already active") : les tâches profilées passent l'une après l'autre
+_PROFILING_LOCK = threading.Lock()
+
+class ScanProfiler:
+    # cProfile ne suit que son thread : chaque tâche est profilée à part, puis tout est fusionné
+    def __init__(self):
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    def wrap(self, func):
+        def profiled(*args, **kwargs):
+            profile = cProfile.Profile()
+            try:
+                with _PROFILING_LOCK:
+                    return profile.runcall(func, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self._profiles.append(profile)
+        return profiled
+
+    def dump(self, path):
+        with self._lock:
+            profiles = list(self._profiles)
+        if profiles:
+            pstats.Stats(*profiles).dump_stats(path)
+        return path
@@ -0,0 +1,126 @@
+import ipaddress
+import random
+import threading
+import time
+from collections import OrderedDict
+
+# Politesse des audits en masse : débit max par IP cible, par /24 (/48 en IPv6) et global,
+# en connexions par seconde (débit, rafale). None = pas de limite à ce niveau.
+PER_IP_RATE = (50, 100)
+PER_SUBNET_RATE = (200, 300)
+GLOBAL_RATE = (2000, 1000)
+# Requêtes DNS par seconde vers le résolveur (un seul fournisseur derrière)
+DNS_RATE = (500, 500)
+# Nombre max de compartiments gardés en mémoire (les moins récents sont oubliés)
+MAX_BUCKETS = 10000
+
+# Timeouts adaptatifs : srtt + RTT_VAR_FACTOR * rttvar (comme TCP), bornés
+RTT_ALPHA = 0.125
+RTT_BETA = 0.25
+RTT_VAR_FACTOR = 4
+
+# Nouvelles tentatives sur erreur transitoire : délai = BACKOFF_BASE * 2^tentative, plus aléa
+BACKOFF_BASE = 0.1
+BACKOFF_MAX = 1.0
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def reserve(self, now):
+        # Réserve un jeton ; rend l'attente nécessaire avant de l'utiliser (jetons négatifs = file)
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+def _subnet(ip):
+    prefix = 24 if ipaddress.ip_address(ip).version == 4 else 48
+    return str(ipaddress.ip_network(f"{ip}/{prefix}", strict=False))
+
+class RateLimiter:
+    # Partagé par tous les threads : chaque appel réserve un jeton dans chaque compartiment concerné
+    # et attend le plus long des délais (time.sleep ou asyncio.sleep selon l'appelant)
+    def __init__(self, per_ip=PER_IP_RATE, per_subnet=PER_SUBNET_RATE, global_rate=GLOBAL_RATE, dns=DNS_RATE):
+        self._lock = threading.Lock()
+        self.configure(per_ip, per_subnet, global_rate, dns)
+
+    def configure(self, per_ip=PER_IP_RATE, per_subnet=PER_SUBNET_RATE, global_rate=GLOBAL_RATE, dns=DNS_RATE):
+        with self._lock:
+            self.per_ip = per_ip
+            self.per_subnet = per_subnet
+            self._buckets = OrderedDict()
+            self._global = TokenBucket(*global_rate) if global_rate else None
+            self._dns = TokenBucket(*dns) if dns else None
+
+    def _bucket(self, key, limits):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(*limits)
+            if len(self._buckets) > MAX_BUCKETS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def reserve(self, ip):
+        now = time.monotonic()
+        with self._lock:
+            buckets = [self._global] if self._global else []
+            if self.per_subnet:
+                buckets.append(self._bucket(("subnet", _subnet(ip)), self.per_subnet))
+            if self.per_ip:
+                buckets.append(self._bucket(("ip", ip), self.per_ip))
+            return max((bucket.reserve(now) for bucket in buckets), default=0.0)
+
+    def reserve_dns(self):
+        with self._lock:
+            return self._dns.reserve(time.monotonic()) if self._dns else 0.0
+
+    def acquire(self, ip):
+        delay = self.reserve(ip)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+class RttEstimator:
+    # RTT de connexion lissé par IP (srtt / rttvar de la RFC 6298)
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = OrderedDict()
+
+    def observe(self, ip, rtt):
+        with self._lock:
+            stats = self._stats.get(ip)
+            if stats is None:
+                self._stats[ip] = [rtt, rtt / 2]
+                if len(self._stats) > MAX_BUCKETS:
+                    self._stats.popitem(last=False)
+                return
+            srtt, rttvar = stats
+            stats[1] = (1 - RTT_BETA) * rttvar + RTT_BETA * abs(srtt - rtt)
+            stats[0] = (1 - RTT_ALPHA) * srtt + RTT_ALPHA * rtt
+            self._stats.move_to_end(ip)
+
+    def timeout(self, ip, default, minimum, maximum):
+        # Sans mesure pour cette IP : valeur par défaut
+        with self._lock:
+            stats = self._stats.get(ip)
+        if stats is None:
+            return default
+        srtt, rttvar = stats
+        return min(maximum, max(minimum, srtt + RTT_VAR_FACTOR * rttvar))
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+def backoff(attempt):
+    # Délai avant la tentative suivante (exponentiel + aléa pour désynchroniser les threads)
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+LIMITER = RateLimiter()
+RTT = RttEstimator()
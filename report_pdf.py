@@ -0,0 +1,192 @@
+import datetime
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from fpdf import FPDF
+
+from scan_cache import TTLCache
+
+# PDF déjà générés, indexés par le hash du contenu affiché + auteur
+PDF_CACHE = TTLCache(maxsize=64)
+PDF_CACHE_TTL = 3600
+# Export ZIP : nombre de process de rendu
+EXPORT_WORKERS = 4
+# Un PDF se rend en ~0,8 ms mais démarrer les process (spawn) coûte ~1 s :
+# en dessous de ce nombre de rapports, le rendu en série est plus rapide
+EXPORT_PARALLEL_MIN = 2000
+# PDF envoyés à un process par aller-retour (amortit la sérialisation)
+EXPORT_CHUNKSIZE = 100
+
+# Couleurs de la charte
+DARK = (15, 23, 42)
+GREY = (100, 116, 139)
+TEXT = (71, 85, 105)
+OK_COLOR = (21, 128, 61)
+KO_COLOR = (185, 28, 28)
+
+class PDFReport(FPDF):
+    def __init__(self, author_name="CyberAudit"):
+        super().__init__()
+        self.author_name = author_name
+        # Éléments statiques de l'en-tête et du pied de page, calculés une seule fois
+        self.is_default_brand = author_name == "CyberAudit" or not author_name
+        self.reference = f'Réf: AUDIT-{datetime.date.today().strftime("%Y%m%d")}'
+        self.footer_text = f"Rapport généré par {author_name}. Ne remplace pas un pentest complet."
+        self.set_font('Arial', 'B', 24)
+        self.brand_width = self.get_string_width("Cyber")
+
+    def header(self):
+        self.set_fill_color(*DARK)
+        self.rect(0, 0, 210, 50, 'F')
+        self.set_y(20)
+        self.set_font('Arial', 'B', 24)
+        self.set_x(10)
+        if self.is_default_brand:
+            self.set_text_color(255, 255, 255)
+            self.cell(self.brand_width, 10, "Cyber", 0, 0)
+            self.set_text_color(59, 130, 246)
+            self.cell(0, 10, "Audit", 0, 0)
+        else:
+            self.set_text_color(255, 255, 255)
+            self.cell(0, 10, self.author_name, 0, 0)
+        self.set_font('Arial', '', 10)
+        self.set_text_color(148, 163, 184)
+        self.set_x(-70)
+        self.cell(60, 10, self.reference, 0, 0, 'R')
+        self.ln(40)
+
+    def footer(self):
+        self.set_y(-30)
+        self.set_font('Arial', 'I', 8)
+        self.set_text_color(*GREY)
+        self.multi_cell(0, 4, self.footer_text, align='C')
+        self.ln(2)
+        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+
+    def section(self, title, ok, detail, separator=True):
+        # Gabarit commun aux 4 lignes de l'analyse technique
+        self.set_font("Arial", 'B', 11)
+        self.set_text_color(*DARK)
+        self.cell(120, 8, title, 0, 0)
+        self.set_text_color(*(OK_COLOR if ok else KO_COLOR))
+        self.cell(0, 8, "CONFORME" if ok else "ATTENTION", 0, 1, 'R')
+        self.set_font("Arial", '', 10)
+        self.set_text_color(*TEXT)
+        self.cell(0, 6, f"Résultat : {detail}", 0, 1)
+        if separator:
+            self.ln(2)
+            self.set_draw_color(241, 245, 249)
+            self.line(10, self.get_y(), 200, self.get_y())
+            self.ln(4)
+
+def _report_content(data):
+    # Seules les données affichées dans le PDF entrent dans la clé de cache
+    return {
+        "domain": data['domain'],
+        "score": data['score'],
+        "ssl": [data['ssl']['status'], data['ssl'].get('days_left', 0)],
+        "open_ports": data['open_ports'],
+        "dmarc": data['email']['dmarc'],
+        "headers": data['headers']['status'],
+    }
+
+def _render_pdf(data, author_name):
+    pdf = PDFReport(author_name=author_name)
+    pdf.add_page()
+
+    # TITRE
+    pdf.set_font("Arial", 'B', 20)
+    pdf.set_text_color(*DARK)
+    pdf.write(10, "Rapport d'Audit")
+    pdf.write(10, f" : {data['domain']}")
+    pdf.ln(15)
+
+    # DATE
+    pdf.set_font("Arial", '', 11)
+    pdf.set_text_color(*GREY)
+    pdf.cell(0, 10, f"Généré le {datetime.datetime.now().strftime('%d/%m/%Y à %H:%M')}", 0, 1)
+    pdf.ln(10)
+
+    # SCORE
+    if data['score'] >= 80: bg=(220,252,231); txt=(21,128,61); label="EXCELLENT"
+    elif data['score'] >= 50: bg=(254,249,195); txt=(161,98,7); label="MOYEN"
+    else: bg=(254,226,226); txt=(185,28,28); label="CRITIQUE"
+
+    pdf.set_fill_color(*bg)
+    pdf.rect(10, pdf.get_y(), 190, 35, 'F')
+    pdf.set_y(pdf.get_y() + 5)
+    pdf.set_font("Arial", 'B', 12)
+    pdf.set_text_color(100,100,100)
+    pdf.cell(0, 8, "SCORE DE SÉCURITÉ", 0, 1, 'C')
+    pdf.set_font("Arial", 'B', 26)
+    pdf.set_text_color(*txt)
+    pdf.cell(0, 12, f"{data['score']} / 100", 0, 1, 'C')
+    pdf.set_font("Arial", 'B', 10)
+    pdf.cell(0, 8, label, 0, 1, 'C')
+    pdf.ln(15)
+
+    # SECTION TECH
+    pdf.set_font("Arial", 'B', 14)
+    pdf.set_text_color(*DARK)
+    pdf.cell(0, 10, "Analyse Technique", 0, 1)
+    pdf.set_draw_color(226, 232, 240)
+    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+    pdf.ln(5)
+
+    sections = [
+        ("SSL/TLS", data['ssl']['status'], f"Valide ({data['ssl'].get('days_left',0)} jours)"),
+        ("Infrastructure", len(data['open_ports'])==0, f"Ports: {data['open_ports']}" if data['open_ports'] else "Aucun port critique"),
+        ("Email DMARC", data['email']['dmarc'], "Actif" if data['email']['dmarc'] else "Manquant"),
+        ("Sécurité Web (Headers)", data['headers']['status'], "Headers Sécurisés" if data['headers']['status'] else "Headers Manquants (HSTS/X-Frame)"),
+    ]
+    for i, (title, ok, detail) in enumerate(sections):
+        pdf.section(title, ok, detail, separator=i < len(sections) - 1)
+
+    return pdf.output(dest='S').encode('latin-1')
+
+def create_pdf_bytes(data, author_name):
+    # Mémoïsé : les reruns Streamlit ne régénèrent pas un PDF identique
+    key = hashlib.sha256(
+        json.dumps([_report_content(data), author_name], sort_keys=True, default=str).encode()
+    ).hexdigest()
+    pdf_bytes = PDF_CACHE.get(key)
+    if pdf_bytes is None:
+        pdf_bytes = _render_pdf(data, author_name)
+        PDF_CACHE.set(key, pdf_bytes, PDF_CACHE_TTL)
+    return pdf_bytes
+
+def _render_for_zip(data, author_name):
+    return f"Audit_{data['domain']}.pdf", _render_pdf(data, author_name)
+
+def export_reports_zip(results, author_name, fileobj, max_workers=EXPORT_WORKERS):
+    # Chaque PDF est écrit dans le ZIP dès qu'il est prêt. Rendu en série pour les petits exports ;
+    # au-delà de EXPORT_PARALLEL_MIN, process séparés par paquets (mémoire bornée à une tranche)
+    results = iter(results)
+    head = list(itertools.islice(results, EXPORT_PARALLEL_MIN))
+    max_workers = min(max_workers, os.cpu_count() or 1)
+    count = 0
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        if len(head) < EXPORT_PARALLEL_MIN or max_workers < 2:
+            for data in itertools.chain(head, results):
+                archive.writestr(*_render_for_zip(data, author_name))
+                count += 1
+            return count
+        items = itertools.chain(head, results)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+            while True:
+                batch = list(itertools.islice(items, max_workers * EXPORT_CHUNKSIZE * 2))
+                if not batch:
+                    break
+                rendered = executor.map(
+                    _render_for_zip, batch, itertools.repeat(author_name), chunksize=EXPORT_CHUNKSIZE,
+                )
+                for name, pdf_bytes in rendered:
+                    archive.writestr(name, pdf_bytes)
+                    count += 1
+    return count
@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Base SQLite partagée par toutes les sessions (surchargée via CYBERAUDIT_DB)
+DB_PATH = os.environ.get("CYBERAUDIT_DB", "cyberaudit.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    domain TEXT NOT NULL,
+    scanned_at REAL NOT NULL,
+    score INTEGER NOT NULL,
+    ssl_status INTEGER NOT NULL,
+    ssl_days_left INTEGER NOT NULL,
+    ssl_issuer TEXT,
+    open_ports TEXT NOT NULL,
+    dmarc INTEGER NOT NULL,
+    headers_status INTEGER NOT NULL,
+    hsts INTEGER NOT NULL,
+    headers_missing TEXT NOT NULL,
+    job_id INTEGER,
+    owner TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_scans_domain ON scans (domain, scanned_at DESC);
+CREATE INDEX IF NOT EXISTS idx_scans_scanned_at ON scans (scanned_at DESC);
+CREATE INDEX IF NOT EXISTS idx_scans_job ON scans (job_id);
+-- Historique d'un utilisateur page par page, et dernier audit de chacun de ses domaines
+CREATE INDEX IF NOT EXISTS idx_scans_owner_scanned_at ON scans (owner, scanned_at DESC);
+CREATE INDEX IF NOT EXISTS idx_scans_owner ON scans (owner, domain);
+"""
+
+COLUMNS = (
+    "domain", "scanned_at", "score", "ssl_status", "ssl_days_left", "ssl_issuer",
+    "open_ports", "dmarc", "headers_status", "hsts", "headers_missing", "job_id", "owner",
+)
+
+def _to_row(result, scanned_at=None, job_id=None, owner=None):
+    # Un résultat de run_full_scan -> une ligne compacte (listes en texte "a,b")
+    return (
+        result["domain"],
+        scanned_at or time.time(),
+        result["score"],
+        int(result["ssl"]["status"]),
+        result["ssl"].get("days_left", 0),
+        result["ssl"].get("issuer"),
+        ",".join(str(p) for p in result["open_ports"]),
+        int(result["email"]["dmarc"]),
+        int(result["headers"]["status"]),
+        int(result["headers"]["hsts"]),
+        ",".join(result["headers"]["missing"]),
+        job_id,
+        owner,
+    )
+
+def _from_row(row):
+    return {
+        "id": row["id"],
+        "domain": row["domain"],
+        "scanned_at": row["scanned_at"],
+        "score": row["score"],
+        "ssl": {"status": bool(row["ssl_status"]), "days_left": row["ssl_days_left"], "issuer": row["ssl_issuer"]},
+        "open_ports": [int(p) for p in row["open_ports"].split(",") if p],
+        "email": {"dmarc": bool(row["dmarc"])},
+        "headers": {
+            "status": bool(row["headers_status"]),
+            "hsts": bool(row["hsts"]),
+            "missing": [m for m in row["headers_missing"].split(",") if m],
+        },
+    }
+
+class ScanStore:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self):
+        # Une connexion par thread : sqlite3 n'aime pas les partages entre threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            # WAL : les lectures de l'historique ne bloquent pas les écritures des scans
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save_scan(self, result, job_id=None, owner=None):
+        return self.save_scans([result], job_id, owner)
+
+    def save_scans(self, results, job_id=None, owner=None):
+        # Insertion groupée dans une seule transaction (audits en masse)
+        rows = [_to_row(result, job_id=job_id, owner=owner) for result in results]
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with self._connection() as conn:
+            conn.executemany(f"INSERT INTO scans ({', '.join(COLUMNS)}) VALUES ({placeholders})", rows)
+        return len(rows)
+
+    def _filters(self, domain=None, job_id=None, owner=None):
+        clauses, params = [], []
+        if owner is not None:
+            clauses.append("owner = ?")
+            params.append(owner)
+        if domain:
+            clauses.append("domain = ?")
+            params.append(domain)
+        if job_id is not None:
+            clauses.append("job_id = ?")
+            params.append(job_id)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def count_scans(self, domain=None, job_id=None, owner=None):
+        where, params = self._filters(domain, job_id, owner)
+        return self._connection().execute(f"SELECT COUNT(*) FROM scans{where}", params).fetchone()[0]
+
+    def fetch_page(self, page=0, page_size=25, domain=None, job_id=None, owner=None):
+        # Seules les lignes de la page demandée sont lues (plus récentes d'abord)
+        where, params = self._filters(domain, job_id, owner)
+        query = f"SELECT * FROM scans{where} ORDER BY scanned_at DESC LIMIT ? OFFSET ?"
+        return [_from_row(row) for row in self._connection().execute(query, params + [page_size, page * page_size])]
+
+    def iter_scans(self, domain=None, job_id=None, chunk_size=500, owner=None):
+        # Parcours complet par paquets (pagination par id) : mémoire constante
+        where, params = self._filters(domain, job_id, owner)
+        where = where + (" AND" if where else " WHERE") + " id > ?"
+        last_id = 0
+        while True:
+            rows = self._connection().execute(
+                f"SELECT * FROM scans{where} ORDER BY id LIMIT ?", params + [last_id, chunk_size]
+            ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield _from_row(row)
+            last_id = rows[-1]["id"]
+
+    def job_domains(self, job_id, domains=None):
+        # Domaines déjà audités pour un job (reprise après redémarrage), parmi domains si donné
+        query, params = "SELECT domain FROM scans WHERE job_id = ?", [job_id]
+        if domains is not None:
+            query += f" AND domain IN ({', '.join('?' for _ in domains)})"
+            params += list(domains)
+        return {row[0] for row in self._connection().execute(query, params)}
+
+    def latest_rows(self, columns=COLUMNS, owner=None):
+        # Dernier audit de chaque domaine, en tuples bruts (analyse du portefeuille, sans _from_row)
+        where, params = self._filters(owner=owner)
+        query = f"SELECT {', '.join(columns)} FROM scans WHERE id IN (SELECT MAX(id) FROM scans{where} GROUP BY domain)"
+        cursor = self._connection().cursor()
+        cursor.row_factory = None
+        return cursor.execute(query, params).fetchall()
+
+    def latest_id(self, owner=None):
+        # Id du dernier audit enregistré : change dès qu'un nouvel audit arrive (clé de cache)
+        where, params = self._filters(owner=owner)
+        return self._connection().execute(f"SELECT MAX(id) FROM scans{where}", params).fetchone()[0]
+
+    def latest_scan(self, domain, owner=None):
+        rows = self.fetch_page(0, 1, domain, owner=owner)
+        return rows[0] if rows else None
@@ -1,56 +1,626 @@
+import asyncio
+import calendar
+import copy
+import http.client
 import socket
 import ssl
+import time
 import datetime
-import dns.resolver
-import requests
+import ipaddress
+import os
+import threading
+from scan_cache import TTLCache
+from metrics import REGISTRY, ScanProfiler, classify_error
+from ratelimit import LIMITER, RTT, backoff
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FuturesTimeout
 
-def check_ssl(domain):
+# Délai global d'un audit : au-delà, les checks non terminés sont marqués en échec
+SCAN_DEADLINE = 6
+
+# Audit en masse : audits simultanés au total et par hôte (IP résolue)
+BATCH_WORKERS = 16
+BATCH_PER_HOST = 1
+# Domaines lus d'avance au maximum quand tous ceux en attente visent des hôtes déjà occupés
+BATCH_MAX_DEFERRED = 10000
+
+# Scan de ports : timeout par connexion et nombre de connexions simultanées max.
+# PORT_TIMEOUT ne sert que tant qu'aucun RTT n'a été mesuré pour l'IP (voir ratelimit.RTT)
+PORT_TIMEOUT = 0.5
+PORT_TIMEOUT_MIN = 0.2
+PORT_TIMEOUT_MAX = 2.0
+PORT_CONCURRENCY = 200
+# Sockets de scan ouverts au total dans le processus (tous audits et workers confondus) :
+# la moitié de la limite de descripteurs, le reste pour SQLite, TLS, HTTP et DNS
+PORT_SOCKETS_FALLBACK = 512
+# Nouvelle tentative sur un port sans réponse (paquet perdu, limitation côté cible)
+PORT_RETRIES = 1
+
+# Profils de ports disponibles pour check_ports
+PORT_PROFILES = {
+    # Ports critiques uniquement
+    "critical": [21, 22, 23, 3389, 8080],
+    "databases": [3306, 5432, 6379, 27017, 9200],
+    # Top 100 des ports TCP (nmap)
+    "top-100": [
+        7, 9, 13, 21, 22, 23, 25, 26, 37, 53, 79, 80, 81, 88, 106, 110, 111, 113, 119, 135,
+        139, 143, 144, 179, 199, 389, 427, 443, 444, 445, 465, 513, 514, 515, 543, 544, 548, 554,
+        587, 631, 646, 873, 990, 993, 995, 1025, 1026, 1027, 1028, 1029, 1110, 1433, 1720, 1723,
+        1755, 1900, 2000, 2001, 2049, 2121, 2717, 3000, 3128, 3306, 3389, 3986, 4899, 5000, 5009,
+        5051, 5060, 5101, 5190, 5357, 5432, 5631, 5666, 5800, 5900, 6000, 6001, 6646, 7070, 8000,
+        8008, 8009, 8080, 8081, 8443, 8888, 9100, 9999, 10000, 32768, 49152, 49153, 49154, 49155,
+        49156, 49157,
+    ],
+}
+
+# Cache des résultats (durées en secondes)
+RESULT_CACHE = TTLCache(maxsize=10000)
+PORTS_TTL = 300
+HEADERS_TTL = 300
+DNS_NEGATIVE_TTL = 300
+# Le certificat est réutilisé jusqu'à CERT_REFRESH_MARGIN jours avant son expiration
+CERT_REFRESH_MARGIN = 15
+
+# Pondération du score (total 100) : partagée avec le scoring vectorisé de analytics.py
+SCORE_WEIGHTS = {
+    "ssl": 25,
+    "ssl_expiring": 15,     # certificat valide mais expirant dans moins de CERT_WARNING_DAYS jours
+    "ports": 25,
+    "per_open_port": 10,
+    "email": 25,
+    "headers": 25,
+    "missing_hsts": 5,
+}
+CERT_WARNING_DAYS = 15
+
+# Port HTTPS des checks SSL et headers, et autorités de confiance (None = magasin système)
+HTTPS_PORT = 443
+TLS_CAFILE = None
+
+# Headers HTTP : timeout, nombre max de redirections, taille du pool de connexions
+HTTP_TIMEOUT = 3
+MAX_REDIRECTS = 5
+# Connexion TCP de la sonde TLS : timeout adaptatif borné par [CONNECT_TIMEOUT_MIN, HTTP_TIMEOUT]
+CONNECT_TIMEOUT_MIN = 0.5
+# Nouvelles tentatives de la sonde TLS et des requêtes HTTP sur erreur transitoire (timeout, reset)
+TLS_RETRIES = 1
+HTTP_POOL_SIZE = 64
+
+# Résolution DNS : timeout global d'une requête
+DNS_TIMEOUT = 3
+# Serveurs DNS à interroger (None = /etc/resolv.conf)
+DNS_NAMESERVERS = None
+DNS_PORT = 53
+
+# Check email : sélecteurs DKIM courants testés, limite de lookups SPF (RFC 7208)
+DKIM_SELECTORS = ("default", "google", "selector1", "selector2", "k1", "s1", "s2", "dkim", "mail", "smtp")
+SPF_MAX_LOOKUPS = 10
+SPF_LOOKUP_TERMS = ("include", "a", "mx", "ptr", "exists", "redirect")
+
+# Profilage cProfile de chaque audit (dossier de sortie des .prof, désactivé si vide)
+PROFILE_DIR = os.environ.get("CYBERAUDIT_PROFILE_DIR")
+
+# Résultats par défaut si un check dépasse le délai global
+FALLBACK_RESULTS = {
+    "ssl": {"status": False, "days_left": 0, "issuer": "Error"},
+    "open_ports": [],
+    "email": {"dmarc": False},
+    "headers": {"status": False, "hsts": False, "missing": ["Unreachable"]},
+}
+
+# --- RÉSOLUTION DNS (une seule passe par audit) ---
+_resolver = None
+
+def _get_resolver():
+    # Résolveur asynchrone partagé : /etc/resolv.conf n'est lu qu'une fois
+    global _resolver
+    if _resolver is None:
+        # Import différé : dnspython n'est chargé qu'au premier check DNS
+        import dns.asyncresolver
+        resolver = dns.asyncresolver.Resolver()
+        resolver.lifetime = DNS_TIMEOUT
+        if DNS_NAMESERVERS:
+            resolver.nameservers = list(DNS_NAMESERVERS)
+            resolver.port = DNS_PORT
+        _resolver = resolver
+    return _resolver
+
+def reset_clients():
+    # Reconstruit le résolveur et la session HTTP partagés (après un changement de configuration)
+    global _resolver, _http_session
+    _resolver = None
+    _http_session = None
+    RESULT_CACHE.clear()
+    RTT.clear()
+
+def _rdata_to_text(rdata):
+    if rdata.rdtype.name == "TXT":
+        return b"".join(rdata.strings).decode("utf-8", errors="ignore")
+    return rdata.to_text()
+
+# Requêtes DNS en cours, par boucle asyncio : deux demandes identiques simultanées n'en font qu'une
+_inflight = {}
+
+async def query_dns(name, rdtype, force_refresh=False):
+    # (enregistrements, ttl), ([], ttl) si le nom n'existe pas, None si erreur réseau
+    cache_key = ("dns", name, rdtype)
+    cached = None if force_refresh else RESULT_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+    key = (asyncio.get_running_loop(), name, rdtype)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_query_network(name, rdtype, cache_key))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(task)
+
+async def _query_network(name, rdtype, cache_key):
+    import dns.resolver
+    delay = LIMITER.reserve_dns()
+    if delay:
+        await asyncio.sleep(delay)
+    try:
+        answers = await _get_resolver().resolve(name, rdtype)
+        answer = ([_rdata_to_text(r) for r in answers], answers.rrset.ttl)
+    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+        # Cache négatif local
+        answer = ([], DNS_NEGATIVE_TTL)
+    except Exception as e:
+        REGISTRY.count_error("dns_query", classify_error(e))
+        return None
+    RESULT_CACHE.set(cache_key, answer, answer[1])
+    return answer
+
+async def _resolve_records(queries, force_refresh=False):
+    answers = await asyncio.gather(*(query_dns(name, rdtype, force_refresh) for name, rdtype in queries))
+    return dict(zip(queries, answers))
+
+def _target_queries(domain):
+    return [(domain, "A"), (domain, "AAAA"), (f"_dmarc.{domain}", "TXT")]
+
+async def resolve_target_async(domain, force_refresh=False):
+    start = time.perf_counter()
+    try:
+        # IP saisie directement : rien à résoudre
+        ipaddress.ip_address(domain)
+        return {"domain": domain, "addresses": [domain], "nxdomain": False, "error": None, "records": {}, "duration": 0.0}
+    except ValueError:
+        pass
+    records = await _resolve_records(_target_queries(domain), force_refresh)
+    addresses = []
+    for rdtype in ("A", "AAAA"):
+        answer = records[(domain, rdtype)]
+        if answer:
+            addresses.extend(answer[0])
+    # Inexistant seulement si A et AAAA ont reçu une vraie réponse négative ;
+    # None = résolveur en panne (timeout, SERVFAIL) : on ne sait pas
+    negative = all(records[(domain, rdtype)] is not None for rdtype in ("A", "AAAA"))
+    if not addresses:
+        # Dernier recours : résolveur système (fichier hosts, noms locaux)
+        try:
+            addresses = await asyncio.to_thread(_resolve_addresses, domain)
+        except OSError:
+            pass
+        except ValueError:
+            # UnicodeError : nom mal formé ("a..com", label de plus de 63 caractères), il ne peut pas exister
+            negative = True
+    return {
+        "domain": domain, "addresses": addresses, "nxdomain": not addresses and negative,
+        "error": "dns" if not addresses and not negative else None,
+        "records": records, "duration": time.perf_counter() - start,
+    }
+
+def resolve_target(domain, force_refresh=False):
+    # A/AAAA + TXT _dmarc en parallèle, partagés ensuite par tous les checks
+    return asyncio.run(resolve_target_async(domain, force_refresh))
+
+def resolve_targets(domains, force_refresh=False):
+    async def resolve_all():
+        return await asyncio.gather(*(resolve_target_async(d, force_refresh) for d in domains))
+    return dict(zip(domains, asyncio.run(resolve_all())))
+
+def _resolve_addresses(domain):
+    # Adresses IPv4 et IPv6 de la cible, sans doublons
+    infos = socket.getaddrinfo(domain, None, proto=socket.IPPROTO_TCP)
+    addresses = []
+    for family, _, _, _, sockaddr in infos:
+        if family in (socket.AF_INET, socket.AF_INET6) and sockaddr[0] not in addresses:
+            addresses.append(sockaddr[0])
+    return addresses
+
+def _connect_any(addresses, port, timeout):
+    # Première adresse joignable parmi celles résolues, au débit autorisé par LIMITER ;
+    # le timeout de connexion s'adapte au RTT déjà mesuré pour chaque IP
+    last_error = OSError("no address")
+    for ip in addresses:
+        LIMITER.acquire(ip)
+        start = time.perf_counter()
+        try:
+            sock = socket.create_connection((ip, port), timeout=RTT.timeout(ip, timeout, CONNECT_TIMEOUT_MIN, timeout))
+        except OSError as e:
+            last_error = e
+            continue
+        RTT.observe(ip, time.perf_counter() - start)
+        sock.settimeout(timeout)
+        return sock
+    raise last_error
+
+def _is_transient(error):
+    return classify_error(error) in ("timeout", "network")
+
+# --- SONDE TLS (une seule poignée de main pour le certificat ET les headers) ---
+def _public_key_info(der_cert):
+    # Type et taille de la clé publique (cryptography est optionnel)
+    try:
+        from cryptography import x509
+        from cryptography.hazmat.primitives.asymmetric import dsa, ec, ed448, ed25519, rsa
+    except ImportError:
+        return "Unknown", 0
+    key = x509.load_der_x509_certificate(der_cert).public_key()
+    if isinstance(key, rsa.RSAPublicKey):
+        return "RSA", key.key_size
+    if isinstance(key, ec.EllipticCurvePublicKey):
+        return f"EC {key.curve.name}", key.key_size
+    if isinstance(key, dsa.DSAPublicKey):
+        return "DSA", key.key_size
+    if isinstance(key, ed25519.Ed25519PublicKey):
+        return "Ed25519", 256
+    if isinstance(key, ed448.Ed448PublicKey):
+        return "Ed448", 456
+    return "Unknown", 0
+
+def _cert_name(name, field="commonName"):
+    return dict(x[0] for x in name).get(field, "Unknown")
+
+def probe_tls(domain, resolution=None):
+    # Nouvelle tentative avec backoff si la connexion échoue de façon transitoire
+    for attempt in range(TLS_RETRIES + 1):
+        probe = _probe_tls_once(domain, resolution)
+        if "error" not in probe or attempt == TLS_RETRIES or not _is_transient(probe["error"]):
+            return probe
+        REGISTRY.count_error("tls_probe_retry", classify_error(probe["error"]))
+        time.sleep(backoff(attempt))
+
+def _probe_tls_once(domain, resolution=None):
+    # Certificat, protocole, suite de chiffrement, puis HEAD / sur la même connexion
+    addresses = resolution["addresses"] if resolution else [domain]
+    context = ssl.create_default_context(cafile=TLS_CAFILE)
+    timings = {}
     try:
-        context = ssl.create_default_context()
-        with socket.create_connection((domain, 443), timeout=3) as sock:
+        start = time.perf_counter()
+        with _connect_any(addresses, HTTPS_PORT, HTTP_TIMEOUT) as sock:
+            timings["connect"] = time.perf_counter() - start
+            start = time.perf_counter()
             with context.wrap_socket(sock, server_hostname=domain) as ssock:
+                timings["tls_handshake"] = time.perf_counter() - start
                 cert = ssock.getpeercert()
-                not_after = datetime.datetime.strptime(cert['notAfter'], '%b %d %H:%M:%S %Y %Z')
-                days_left = (not_after - datetime.datetime.utcnow()).days
-                issuer = dict(x[0] for x in cert['issuer'])
-                common_name = issuer.get('commonName', 'Unknown')
-                return {"status": True, "days_left": days_left, "issuer": common_name}
-    except:
-        return {"status": False, "days_left": 0, "issuer": "Error"}
-
-def check_ports(domain):
-    # Ports critiques uniquement
-    target_ports = [21, 22, 23, 3389, 8080] 
-    open_ports = []
+                key_type, key_bits = _public_key_info(ssock.getpeercert(binary_form=True))
+                cipher_name, _, cipher_bits = ssock.cipher()
+                # get_verified_chain n'existe qu'à partir de Python 3.13
+                chain = [cert]
+                if hasattr(ssock, "get_verified_chain"):
+                    chain = [c.get_info() for c in ssock.get_verified_chain()]
+                start = time.perf_counter()
+                http_res = _head_over(ssock, domain)
+                if http_res:
+                    timings["http_ttfb"] = time.perf_counter() - start
+                probe = {
+                    "cert": cert,
+                    "chain": [_cert_name(c["subject"]) for c in chain],
+                    "protocol": ssock.version(),
+                    "cipher": cipher_name,
+                    "cipher_bits": cipher_bits,
+                    "key_type": key_type,
+                    "key_bits": key_bits,
+                    "http": http_res,
+                    "timings": timings,
+                }
+    except Exception as e:
+        return {"error": e, "timings": timings}
+    return probe
+
+def _head_over(ssock, domain):
+    # Requête HTTP sur la connexion TLS déjà ouverte : pas de seconde poignée de main
     try:
-        ip = socket.gethostbyname(domain)
-        for port in target_ports:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(0.5)
-            result = sock.connect_ex((ip, port))
-            if result == 0:
-                open_ports.append(port)
-            sock.close()
-    except:
-        pass
+        ssock.sendall(
+            f"HEAD / HTTP/1.1\r\nHost: {domain}\r\nUser-Agent: CyberAudit\r\nConnection: close\r\n\r\n".encode()
+        )
+        response = http.client.HTTPResponse(ssock, method="HEAD")
+        response.begin()
+        # HTTPMessage : recherche des headers insensible à la casse
+        return {"status": response.status, "headers": response.msg}
+    except Exception:
+        return None
+
+def check_ssl(domain, force_refresh=False, resolution=None, tls=None):
+    cached = None if force_refresh else RESULT_CACHE.get(("ssl", domain))
+    if cached is None:
+        probe = tls or probe_tls(domain, resolution)
+        if "error" in probe:
+            return {"status": False, "days_left": 0, "issuer": "Error", "error": classify_error(probe["error"])}
+        cert = probe["cert"]
+        not_after = datetime.datetime.strptime(cert['notAfter'], '%b %d %H:%M:%S %Y %Z')
+        cached = {
+            "not_after": not_after,
+            # Horodatages (epoch) : date du téléchargement du certificat et de son expiration
+            "fetched_at": time.time(),
+            "expires_at": calendar.timegm(not_after.timetuple()),
+            "issuer": _cert_name(cert['issuer']),
+            "sans": [value for kind, value in cert.get('subjectAltName', ()) if kind == "DNS"],
+            "chain": probe["chain"],
+            "key_type": probe["key_type"],
+            "key_bits": probe["key_bits"],
+            "protocol": probe["protocol"],
+            "cipher": probe["cipher"],
+        }
+        # Le certificat ne change pas tant qu'on n'approche pas de son expiration
+        ttl = (not_after - datetime.timedelta(days=CERT_REFRESH_MARGIN) - datetime.datetime.utcnow()).total_seconds()
+        RESULT_CACHE.set(("ssl", domain), cached, ttl)
+    result = copy.deepcopy(cached)
+    not_after = result.pop("not_after")
+    days_left = (not_after - datetime.datetime.utcnow()).days
+    return {"status": True, "days_left": days_left, **result}
+
+def _socket_budget():
+    try:
+        import resource
+    except ImportError:
+        # Windows : pas de RLIMIT_NOFILE
+        return PORT_SOCKETS_FALLBACK
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return PORT_SOCKETS_FALLBACK
+    return max(16, soft // 2)
+
+PORT_SOCKETS = threading.BoundedSemaphore(_socket_budget())
+
+async def _acquire_socket():
+    # Sémaphore partagé entre threads (une boucle asyncio par check_ports) : attente sans bloquer la boucle
+    while not PORT_SOCKETS.acquire(blocking=False):
+        await asyncio.sleep(0.01)
+
+async def _connect(ip, port, timeout):
+    await _acquire_socket()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+    finally:
+        PORT_SOCKETS.release()
+
+async def _probe_port(ip, port, semaphore):
+    async with semaphore:
+        for attempt in range(PORT_RETRIES + 1):
+            delay = LIMITER.reserve(ip)
+            if delay:
+                await asyncio.sleep(delay)
+            timeout = RTT.timeout(ip, PORT_TIMEOUT, PORT_TIMEOUT_MIN, PORT_TIMEOUT_MAX)
+            start = time.perf_counter()
+            try:
+                await _connect(ip, port, timeout)
+            except ConnectionRefusedError:
+                # Port fermé : le RST donne quand même une mesure du RTT
+                RTT.observe(ip, time.perf_counter() - start)
+                REGISTRY.count_port_probe("refused")
+                return False
+            except (OSError, asyncio.TimeoutError) as e:
+                outcome = classify_error(e)
+                if outcome != "timeout":
+                    # EMFILE, réseau injoignable... : on ne sait rien du port, le check échoue
+                    REGISTRY.count_port_probe(outcome)
+                    raise
+                # timeout = port filtré... ou paquet perdu : on retente avant de conclure
+                if attempt < PORT_RETRIES:
+                    REGISTRY.count_port_probe("retry")
+                    await asyncio.sleep(backoff(attempt))
+                    continue
+                REGISTRY.count_port_probe(outcome)
+                return False
+            RTT.observe(ip, time.perf_counter() - start)
+            REGISTRY.count_port_probe("open")
+            return True
+
+async def _probe_ports(addresses, ports, concurrency):
+    # Toutes les connexions partent en même temps, bornées par le sémaphore et par LIMITER
+    semaphore = asyncio.Semaphore(concurrency)
+    targets = [(ip, port) for ip in addresses for port in ports]
+    results = await asyncio.gather(*(_probe_port(ip, port, semaphore) for ip, port in targets))
+    return sorted({port for (ip, port), is_open in zip(targets, results) if is_open})
+
+def check_ports(domain, profile="critical", force_refresh=False, resolution=None):
+    # profile : nom d'un profil de PORT_PROFILES ou liste de ports explicite
+    target_ports = PORT_PROFILES[profile] if isinstance(profile, str) else list(profile)
+    cache_key = ("ports", domain, tuple(target_ports))
+    cached = None if force_refresh else RESULT_CACHE.get(cache_key)
+    if cached is not None:
+        return list(cached)
+    # Erreur (résolution, EMFILE...) : remontée à iter_full_scan, rien n'est mis en cache
+    addresses = resolution["addresses"] if resolution else _resolve_addresses(domain)
+    open_ports = asyncio.run(_probe_ports(addresses, target_ports, PORT_CONCURRENCY))
+    RESULT_CACHE.set(cache_key, tuple(open_ports), PORTS_TTL)
     return open_ports
 
-def check_email_security(domain):
+def _email_queries(domain):
+    # Tous les enregistrements du check email, interrogés en une seule vague
+    queries = {
+        "dmarc": (f"_dmarc.{domain}", "TXT"),
+        "spf": (domain, "TXT"),
+        "mx": (domain, "MX"),
+        "mta_sts": (f"_mta-sts.{domain}", "TXT"),
+        "tls_rpt": (f"_smtp._tls.{domain}", "TXT"),
+    }
+    for selector in DKIM_SELECTORS:
+        queries[f"dkim:{selector}"] = (f"{selector}._domainkey.{domain}", "TXT")
+    return queries
+
+def _tag_value(record, tag):
+    # Valeur d'un tag "p=reject; rua=..." (DMARC)
+    for part in record.split(";"):
+        key, _, value = part.strip().partition("=")
+        if key.strip().lower() == tag:
+            return value.strip()
+    return None
+
+def _spf_record(records):
+    # Plusieurs enregistrements SPF = erreur permanente (RFC 7208), traité comme absent
+    spf = [r for r in records if r.lower().startswith("v=spf1")]
+    return spf[0] if len(spf) == 1 else None
+
+def _spf_terms(record):
+    # (type, cible) des termes SPF qui déclenchent une requête DNS
+    terms = []
+    for term in record.split()[1:]:
+        term = term.lstrip("+-~?").lower()
+        kind, _, target = term.replace("=", ":", 1).partition(":")
+        kind = kind.split("/")[0]
+        if kind in SPF_LOOKUP_TERMS:
+            terms.append((kind, target))
+    return terms
+
+async def _expand_spf(record, force_refresh=False):
+    # Les include/redirect sont récupérés niveau par niveau, chaque niveau en parallèle,
+    # et chaque nom n'est interrogé qu'une fois même s'il est inclus plusieurs fois.
+    # Rend (nombre de lookups DNS au sens de la RFC 7208, None) ou (None, erreur)
+    records, to_fetch = {}, [record]
+    while to_fetch:
+        names = []
+        for spf in to_fetch:
+            for kind, target in _spf_terms(spf):
+                if kind in ("include", "redirect") and target and target not in records and target not in names:
+                    names.append(target)
+        answers = await _resolve_records([(name, "TXT") for name in names], force_refresh)
+        to_fetch = []
+        for (name, _), answer in answers.items():
+            records[name] = _spf_record(answer[0]) if answer else None
+            if records[name]:
+                to_fetch.append(records[name])
+        if len(records) > SPF_MAX_LOOKUPS:
+            # Chaque nom distinct coûte au moins un lookup : inutile d'aller plus loin
+            return None, "too_many_lookups"
+
+    def count(spf, parents):
+        # Évaluation comme un serveur de réception : un nom inclus deux fois compte deux fois
+        total = 0
+        for kind, target in _spf_terms(spf):
+            total += 1
+            if kind in ("include", "redirect") and target:
+                if target in parents:
+                    raise ValueError("loop")
+                if records.get(target) is None:
+                    raise ValueError("include_not_found")
+                total += count(records[target], parents | {target})
+            if total > SPF_MAX_LOOKUPS:
+                raise ValueError("too_many_lookups")
+        return total
+
     try:
-        answers = dns.resolver.resolve(f'_dmarc.{domain}', 'TXT')
-        dmarc_record = str(answers[0])
-        has_dmarc = "v=DMARC1" in dmarc_record
-        return {"dmarc": has_dmarc}
-    except:
-        return {"dmarc": False}
-
-def check_security_headers(domain):
+        return count(record, frozenset()), None
+    except ValueError as e:
+        return None, str(e)
+
+async def _email_security_async(domain, force_refresh=False, resolution=None):
+    queries = _email_queries(domain)
+    known = resolution["records"] if resolution else {}
+    missing = [q for q in queries.values() if q not in known]
+    answers = dict(known)
+    answers.update(await _resolve_records(missing, force_refresh))
+    results = {name: answers[query] for name, query in queries.items()}
+    if results["dmarc"] is None:
+        return {"dmarc": False, "error": "dns"}
+
+    dmarc = [r for r in results["dmarc"][0] if "v=DMARC1" in r]
+    spf = _spf_record(results["spf"][0]) if results["spf"] else None
+    spf_lookups, spf_error = await _expand_spf(spf, force_refresh) if spf else (0, None)
+    spf_all = [t for t in (spf or "").split() if t.lstrip("+-~?").lower() == "all"]
+    return {
+        "dmarc": bool(dmarc),
+        "dmarc_policy": _tag_value(dmarc[0], "p") if dmarc else None,
+        # sp= : politique appliquée aux sous-domaines qui n'ont pas leur propre DMARC
+        "dmarc_subdomain_policy": _tag_value(dmarc[0], "sp") if dmarc else None,
+        "spf": spf is not None and spf_error is None,
+        "spf_all": spf_all[-1] if spf_all else None,
+        "spf_lookups": spf_lookups,
+        "spf_error": spf_error,
+        "dkim": [name.split(":", 1)[1] for name, answer in results.items()
+                 if name.startswith("dkim:") and answer and any("p=" in r for r in answer[0])],
+        "mx": sorted(r.split()[-1].rstrip(".") for r in results["mx"][0]) if results["mx"] else [],
+        "mta_sts": bool(results["mta_sts"]) and any(r.startswith("v=STSv1") for r in results["mta_sts"][0]),
+        "tls_rpt": bool(results["tls_rpt"]) and any(r.startswith("v=TLSRPTv1") for r in results["tls_rpt"][0]),
+        # Valable jusqu'à expiration du premier enregistrement (réutilisé par scheduler.py)
+        "ttl": min(answer[1] for answer in results.values() if answer),
+    }
+
+def check_email_security(domain, force_refresh=False, resolution=None):
+    # Les TTL des enregistrements DNS sont respectés par le cache de query_dns
+    return asyncio.run(_email_security_async(domain, force_refresh, resolution))
+
+_http_session = None
+
+def _get_http_session():
+    # Session partagée : les connexions TCP/TLS sont réutilisées d'un audit à l'autre
+    global _http_session
+    if _http_session is None:
+        # Import différé : requests n'est chargé que si la sonde TLS ne suffit pas
+        import requests
+        import requests.adapters
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.max_redirects = MAX_REDIRECTS
+        session.headers["User-Agent"] = "CyberAudit"
+        if TLS_CAFILE:
+            session.verify = TLS_CAFILE
+        _http_session = session
+    return _http_session
+
+def _fetch_headers(url):
+    # Nouvelle tentative avec backoff si la requête échoue de façon transitoire
+    for attempt in range(TLS_RETRIES + 1):
+        try:
+            return _fetch_headers_once(url)
+        except Exception as e:
+            if attempt == TLS_RETRIES or not _is_transient(e):
+                raise
+            time.sleep(backoff(attempt))
+
+def _fetch_headers_once(url):
+    session = _get_http_session()
+    # HEAD d'abord : seuls les headers nous intéressent
+    response = session.head(url, timeout=HTTP_TIMEOUT, allow_redirects=True)
+    chain = [r.url for r in response.history]
+    if response.status_code >= 400:
+        # Certains serveurs refusent HEAD : GET en streaming sur l'URL finale, sans jamais lire le corps
+        with session.get(response.url, timeout=HTTP_TIMEOUT, allow_redirects=True, stream=True) as response:
+            chain += [r.url for r in response.history]
+    return response, chain
+
+def check_security_headers(domain, force_refresh=False, resolution=None, tls=None):
     # Vérification des headers HTTP de sécurité
+    cached = None if force_refresh else RESULT_CACHE.get(("headers", domain))
+    if cached is not None:
+        return copy.deepcopy(cached)
     try:
         # On tente de se connecter en HTTPS
-        url = f"https://{domain}"
-        response = requests.get(url, timeout=3)
-        headers = response.headers
+        url = f"https://{domain}" if HTTPS_PORT == 443 else f"https://{domain}:{HTTPS_PORT}"
+        if tls is None:
+            tls = probe_tls(domain, resolution)
+        if "error" in tls:
+            raise tls["error"]
+        http_res = tls.get("http")
+        if http_res and http_res["status"] < 300:
+            # Réponse directe obtenue pendant la sonde TLS : rien à refaire
+            headers = http_res["headers"]
+            final_url, redirects = url + "/", []
+        else:
+            # Redirection ou HEAD refusé : on suit la chaîne avec la session partagée
+            response, redirects = _fetch_headers(url)
+            headers, final_url = response.headers, response.url
         
         # Points clés
         hsts = 'Strict-Transport-Security' in headers
@@ -64,53 +634,274 @@ def check_security_headers(domain):
         if not hsts: missing.append("HSTS")
         if not x_frame: missing.append("X-Frame")
         
-        return {"status": is_secure, "hsts": hsts, "missing": missing}
-    except:
-        return {"status": False, "hsts": False, "missing": ["Unreachable"]}
+        result = {
+            "status": is_secure, "hsts": hsts, "missing": missing,
+            "final_url": final_url,
+            "redirects": redirects,
+        }
+    except Exception as e:
+        return {"status": False, "hsts": False, "missing": ["Unreachable"], "error": classify_error(e)}
+    RESULT_CACHE.set(("headers", domain), result, HEADERS_TTL)
+    return copy.deepcopy(result)
 
-def calculate_score(ssl_data, open_ports, email_data, headers_data):
+def calculate_score(ssl_data, open_ports, email_data, headers_data, weights=SCORE_WEIGHTS):
     score = 0
     
     # 1. SSL (25 Pts)
-    if ssl_data['status'] and ssl_data['days_left'] > 15:
-        score += 25
+    if ssl_data['status'] and ssl_data['days_left'] > CERT_WARNING_DAYS:
+        score += weights["ssl"]
     elif ssl_data['status']:
-        score += 15
+        score += weights["ssl_expiring"]
 
     # 2. Infrastructure (25 Pts)
     if len(open_ports) == 0:
-        score += 25
+        score += weights["ports"]
     else:
-        score += max(0, 25 - (len(open_ports) * 10))
+        score += max(0, weights["ports"] - (len(open_ports) * weights["per_open_port"]))
 
     # 3. Email (25 Pts)
     if email_data['dmarc']:
-        score += 25
+        score += weights["email"]
         
     # 4. Headers (25 Pts)
     if headers_data['status']:
-        score += 25
+        score += weights["headers"]
     # Bonus si HSTS est là
     if headers_data['status'] and not headers_data['hsts']: 
-        score -= 5 # Petite pénalité si X-Frame est là mais pas HSTS
+        score -= weights["missing_hsts"] # Petite pénalité si X-Frame est là mais pas HSTS
         
-    return score
+    # Pondérations personnalisées (en-têtes à 0, pénalité HSTS > 0) : jamais sous zéro
+    return max(0, score)
 
-def run_full_scan(domain):
-    domain = domain.replace("https://", "").replace("http://", "").replace("www.", "").split('/')[0]
-    
-    ssl_res = check_ssl(domain)
-    ports_res = check_ports(domain)
-    email_res = check_email_security(domain)
-    headers_res = check_security_headers(domain)
-    
-    final_score = calculate_score(ssl_res, ports_res, email_res, headers_res)
-    
-    return {
+def _tls_checks(domain, force_refresh, resolution, timings):
+    # La sonde n'est lancée que si l'un des deux résultats manque dans le cache
+    tls = None
+    if force_refresh or RESULT_CACHE.get(("ssl", domain)) is None or RESULT_CACHE.get(("headers", domain)) is None:
+        tls = probe_tls(domain, resolution)
+        timings.update(tls["timings"])
+    ssl_res = check_ssl(domain, force_refresh=force_refresh, resolution=resolution, tls=tls)
+    headers_res = check_security_headers(domain, force_refresh=force_refresh, resolution=resolution, tls=tls)
+    return ssl_res, headers_res
+
+def normalize_domain(domain):
+    return domain.strip().replace("https://", "").replace("http://", "").replace("www.", "").split('/')[0].lower()
+
+def _timed(func, name):
+    # Chaque check écrit ses durées dans son propre dict, fusionné seulement s'il finit à temps :
+    # un check en retard qui continue en arrière-plan ne touche plus aux timings de l'audit
+    def run(domain, timings):
+        start = time.perf_counter()
+        try:
+            return func(domain, timings)
+        finally:
+            timings[name] = time.perf_counter() - start
+    return run
+
+def iter_full_scan(domain, deadline=SCAN_DEADLINE, port_profile="critical", force_refresh=False, resolution=None,
+                   profile_dir=PROFILE_DIR, reuse=None):
+    # Générateur : rend (nom_du_check, résultat) dès qu'un check se termine,
+    # puis ("score", résultat complet) une fois tous les checks connus.
+    # reuse : {nom_du_check: résultat} déjà connus, ces checks ne sont pas relancés
+    domain = normalize_domain(domain)
+    start = time.perf_counter()
+    timings = {}   # étape -> secondes
+    errors = {}    # check -> classe d'erreur
+    profiler = ScanProfiler() if profile_dir else None
+
+    # 1. Résolution DNS unique, partagée par tous les checks
+    if resolution is None:
+        resolve = profiler.wrap(resolve_target) if profiler else resolve_target
+        resolution = resolve(domain, force_refresh)
+    timings["dns"] = resolution.get("duration", 0.0)
+
+    results = {name: copy.deepcopy(fallback) for name, fallback in FALLBACK_RESULTS.items()}
+    pending = set(results)
+    for name, result in (reuse or {}).items():
+        results[name] = copy.deepcopy(result)
+        pending.discard(name)
+        yield name, results[name]
+    # Domaine inexistant, ou résolveur en panne (aucune adresse à tester) : pas de checks réseau,
+    # l'erreur DNS distingue les deux cas (voir scan_failed)
+    if resolution["nxdomain"]:
+        errors["dns"] = "nxdomain"
+    elif resolution.get("error"):
+        errors["dns"] = resolution["error"]
+    elif pending:
+        # 2. Les checks tournent en parallèle : la durée totale ~ celle du check le plus lent
+        #    SSL et headers partagent une seule poignée de main TLS
+        checks = {
+            ("ssl", "headers"): _timed(lambda d, t: _tls_checks(d, force_refresh, resolution, t), "tls_checks"),
+            ("ssl",): _timed(lambda d, t: (check_ssl(d, force_refresh=force_refresh, resolution=resolution),), "ssl"),
+            ("headers",): _timed(lambda d, t: (check_security_headers(d, force_refresh=force_refresh, resolution=resolution),), "headers"),
+            ("open_ports",): _timed(lambda d, t: (check_ports(d, port_profile, force_refresh=force_refresh, resolution=resolution),), "open_ports"),
+            ("email",): _timed(lambda d, t: (check_email_security(d, force_refresh=force_refresh, resolution=resolution),), "email"),
+        }
+        # On ne garde que les checks à lancer (SSL + headers groupés si les deux manquent)
+        if {"ssl", "headers"} <= pending:
+            del checks[("ssl",)], checks[("headers",)]
+        else:
+            del checks[("ssl", "headers")]
+        checks = {names: func for names, func in checks.items() if set(names) <= pending}
+        # Profilage : un seul profileur actif à la fois (Python 3.12+), les checks passent l'un après l'autre,
+        # chacun avec le délai d'un audit normal
+        executor = ThreadPoolExecutor(max_workers=1 if profiler else len(checks), thread_name_prefix="scan")
+        if profiler:
+            deadline *= len(checks)
+        futures = {}
+        for names, func in checks.items():
+            check_timings = {}
+            future = executor.submit(profiler.wrap(func) if profiler else func, domain, check_timings)
+            futures[future] = (names, check_timings)
+        try:
+            for future in as_completed(futures, timeout=max(0, deadline - (time.perf_counter() - start))):
+                names, check_timings = futures[future]
+                timings.update(check_timings)
+                if future.exception() is None:
+                    results.update(zip(names, future.result()))
+                else:
+                    for name in names:
+                        errors[name] = classify_error(future.exception())
+                for name in names:
+                    pending.discard(name)
+                    yield name, results[name]
+        except FuturesTimeout:
+            for name in pending:
+                errors[name] = "deadline"
+        finally:
+            # On n'attend pas les checks en retard : ils finiront en arrière-plan
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    # Checks en échec ou hors délai : résultat par défaut
+    for name in sorted(pending):
+        yield name, results[name]
+
+    score_start = time.perf_counter()
+    final_score = calculate_score(results["ssl"], results["open_ports"], results["email"], results["headers"])
+    timings["scoring"] = time.perf_counter() - score_start
+    timings["total"] = time.perf_counter() - start
+
+    for name, result in results.items():
+        if isinstance(result, dict) and "error" in result:
+            errors.setdefault(name, result["error"])
+    for stage, seconds in timings.items():
+        REGISTRY.observe(stage, seconds)
+    for check, error_class in errors.items():
+        REGISTRY.count_error(check, error_class)
+
+    report = {
         "domain": domain,
         "score": final_score,
-        "ssl": ssl_res,
-        "open_ports": ports_res,
-        "email": email_res,
-        "headers": headers_res
-    }
\ No newline at end of file
+        "ssl": results["ssl"],
+        "open_ports": results["open_ports"],
+        "email": results["email"],
+        "headers": results["headers"],
+        "timings": {stage: round(seconds * 1000, 2) for stage, seconds in timings.items()},
+        "errors": errors,
+    }
+    if profiler:
+        os.makedirs(profile_dir, exist_ok=True)
+        report["profile"] = profiler.dump(os.path.join(profile_dir, f"{domain}-{int(time.time() * 1000)}.prof"))
+    yield "score", report
+
+def scan_failed(report):
+    # Audit sans valeur : la résolution ou l'audit lui-même a échoué (≠ domaine inexistant)
+    return report["errors"].get("dns") not in (None, "nxdomain") or "scan" in report["errors"]
+
+def run_full_scan(domain, **scan_options):
+    for name, result in iter_full_scan(domain, **scan_options):
+        if name == "score":
+            return result
+
+def _failed_report(domain, error):
+    # Audit qui a levé une exception : résultat par défaut, le reste du lot continue
+    results = copy.deepcopy(FALLBACK_RESULTS)
+    return {
+        "domain": domain,
+        "score": calculate_score(results["ssl"], results["open_ports"], results["email"], results["headers"]),
+        **results,
+        "timings": {},
+        "errors": {"scan": classify_error(error)},
+    }
+
+def host_key(resolution):
+    # Un « hôte » = la première IP résolue : les sites mutualisés sur un même serveur partagent
+    # la limite, quel que soit leur suffixe (.co.uk, .gouv.fr...). Sans adresse : le nom lui-même
+    return resolution["addresses"][0] if resolution["addresses"] else resolution["domain"]
+
+def scan_batch(domains, max_workers=BATCH_WORKERS, per_host=BATCH_PER_HOST, **scan_options):
+    # Générateur : rend chaque résultat dès qu'il est prêt, dans l'ordre d'arrivée.
+    # Les domaines sont lus au fil de l'eau, on ne garde en mémoire que les audits en cours.
+    pending = iter(domains)
+    exhausted = False
+    seen = set()
+    # File d'attente par hôte : (domaine, résolution) déjà résolus par blocs, hôtes servis à tour de rôle
+    queues = OrderedDict()
+    nb_deferred = 0
+    host_load = Counter()
+    running = {}
+    force_refresh = scan_options.get("force_refresh", False)
+
+    def refill():
+        # Le DNS des prochains domaines est résolu d'un bloc, avant la phase de connexion
+        nonlocal exhausted, nb_deferred
+        block = []
+        while not exhausted and len(block) < max_workers * 4:
+            try:
+                candidate = normalize_domain(next(pending))
+            except StopIteration:
+                exhausted = True
+                break
+            if candidate and candidate not in seen:
+                seen.add(candidate)
+                block.append(candidate)
+        if block:
+            resolutions = resolve_targets(block, force_refresh)
+            for domain in block:
+                queues.setdefault(host_key(resolutions[domain]), deque()).append((domain, resolutions[domain]))
+            nb_deferred += len(block)
+
+    def pick():
+        # Premier hôte libre ; les hôtes occupés (au plus un par audit en cours) sont sautés
+        nonlocal nb_deferred
+        for host in queues:
+            if host_load[host] < per_host:
+                queue = queues.pop(host)
+                candidate = queue.popleft()
+                if queue:
+                    queues[host] = queue
+                nb_deferred -= 1
+                return candidate
+        return None
+
+    def next_domain():
+        if nb_deferred < max_workers:
+            refill()
+        candidate = pick()
+        # Tous les domaines en attente visent des hôtes occupés : on lit plus loin dans l'entrée
+        # plutôt que d'attendre, dans la limite de BATCH_MAX_DEFERRED domaines en mémoire
+        while candidate is None and not exhausted and nb_deferred < BATCH_MAX_DEFERRED:
+            refill()
+            candidate = pick()
+        return candidate
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch") as executor:
+        while True:
+            while len(running) < max_workers:
+                candidate = next_domain()
+                if candidate is None:
+                    break
+                domain, resolution = candidate
+                host_load[host_key(resolution)] += 1
+                running[executor.submit(run_full_scan, domain, resolution=resolution, **scan_options)] = candidate
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                domain, resolution = running.pop(future)
+                host_load[host_key(resolution)] -= 1
+                try:
+                    result = future.result()
+                except Exception as e:
+                    REGISTRY.count_error("scan", classify_error(e))
+                    result = _failed_report(domain, e)
+                yield result
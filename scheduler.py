@@ -0,0 +1,192 @@
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from scan_store import DB_PATH
+from scanner_logic import CERT_REFRESH_MARGIN, normalize_domain, run_full_scan, scan_failed
+
+# Re-audit planifié d'une liste de domaines : seul le dernier résultat est conservé,
+# l'historique est stocké sous forme de différences (alertes).
+# Chaque utilisateur a sa propre entrée : deux comptes peuvent surveiller le même domaine
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watchlist (
+    domain TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    interval_s INTEGER NOT NULL,
+    next_run REAL NOT NULL,
+    last_run REAL,
+    last_result TEXT,
+    PRIMARY KEY (domain, owner)
+);
+CREATE INDEX IF NOT EXISTS idx_watchlist_next_run ON watchlist (next_run);
+CREATE TABLE IF NOT EXISTS scan_diffs (
+    id INTEGER PRIMARY KEY,
+    domain TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    detected_at REAL NOT NULL,
+    kind TEXT NOT NULL,
+    detail TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scan_diffs_detected_at ON scan_diffs (detected_at DESC);
+CREATE INDEX IF NOT EXISTS idx_scan_diffs_owner ON scan_diffs (owner, detected_at DESC);
+"""
+
+DAY = 86400
+# Le certificat est quand même re-téléchargé au moins une fois par semaine (remplacement, révocation)
+CERT_RECHECK_DAYS = 7
+SCHEDULER_WORKERS = 4
+SCHEDULER_TICK = 60
+
+def _reusable_checks(previous, last_run, now):
+    # Checks dont les entrées n'ont pas pu changer depuis le dernier passage.
+    # Les âges sont comptés depuis le dernier vrai téléchargement, pas depuis le dernier passage :
+    # un résultat réutilisé ne rajeunit pas
+    reuse = {}
+    ssl_res = previous["ssl"]
+    if ssl_res["status"] and "expires_at" in ssl_res:
+        days_left = int((ssl_res["expires_at"] - now) // DAY)
+        if days_left > CERT_REFRESH_MARGIN and now - ssl_res["fetched_at"] < CERT_RECHECK_DAYS * DAY:
+            reuse["ssl"] = dict(ssl_res, days_left=days_left)
+    email_res = previous["email"]
+    # DMARC : on respecte le TTL de l'enregistrement
+    email_checked_at = previous.get("checked_at", {}).get("email", last_run)
+    if "error" not in email_res and now - email_checked_at < email_res.get("ttl", 0):
+        reuse["email"] = email_res
+    return reuse
+
+def diff_results(previous, current):
+    # Liste de (type, détail) décrivant ce qui a changé entre deux audits
+    diffs = []
+    if current["score"] != previous["score"]:
+        kind = "score_drop" if current["score"] < previous["score"] else "score_up"
+        diffs.append((kind, f"{previous['score']} -> {current['score']}"))
+    new_ports = sorted(set(current["open_ports"]) - set(previous["open_ports"]))
+    closed_ports = sorted(set(previous["open_ports"]) - set(current["open_ports"]))
+    if new_ports:
+        diffs.append(("port_opened", ", ".join(map(str, new_ports))))
+    if closed_ports:
+        diffs.append(("port_closed", ", ".join(map(str, closed_ports))))
+    if previous["headers"]["hsts"] and not current["headers"]["hsts"]:
+        diffs.append(("hsts_removed", "Strict-Transport-Security absent"))
+    elif current["headers"]["hsts"] and not previous["headers"]["hsts"]:
+        diffs.append(("hsts_added", "Strict-Transport-Security présent"))
+    if previous["email"]["dmarc"] != current["email"]["dmarc"]:
+        diffs.append(("dmarc_removed" if previous["email"]["dmarc"] else "dmarc_added", "Enregistrement DMARC"))
+    if previous["ssl"]["status"] != current["ssl"]["status"]:
+        diffs.append(("ssl_invalid" if previous["ssl"]["status"] else "ssl_valid", current["ssl"].get("issuer", "")))
+    elif current["ssl"]["status"] and current["ssl"]["days_left"] > previous["ssl"]["days_left"] + 1:
+        diffs.append(("cert_renewed", f"{current['ssl']['days_left']} jours restants"))
+    return diffs
+
+def _compact(result, checked_at):
+    # Ce qu'il faut garder du dernier résultat pour le prochain passage
+    compact = {key: result[key] for key in ("domain", "score", "ssl", "open_ports", "email", "headers")}
+    compact["checked_at"] = checked_at
+    return compact
+
+class Scheduler:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def watch(self, domain, owner, interval_s=DAY):
+        domain = normalize_domain(domain)
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO watchlist (domain, owner, interval_s, next_run) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(domain, owner) DO UPDATE SET interval_s = excluded.interval_s",
+                (domain, owner, interval_s, time.time()),
+            )
+        return domain
+
+    def unwatch(self, domain, owner):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM watchlist WHERE domain = ? AND owner = ?", (domain, owner))
+
+    def list_watched(self, owner):
+        rows = self._connection().execute("SELECT * FROM watchlist WHERE owner = ? ORDER BY domain", (owner,))
+        return [dict(row, last_result=json.loads(row["last_result"]) if row["last_result"] else None) for row in rows]
+
+    def recent_diffs(self, owner, limit=50):
+        rows = self._connection().execute(
+            "SELECT * FROM scan_diffs WHERE owner = ? ORDER BY detected_at DESC LIMIT ?", (owner, limit),
+        )
+        return [dict(row) for row in rows]
+
+    def run_due(self, now=None, max_workers=SCHEDULER_WORKERS):
+        # Re-audite les domaines dont l'échéance est passée ; rend le nombre de domaines traités
+        now = now or time.time()
+        due = self._connection().execute("SELECT * FROM watchlist WHERE next_run <= ?", (now,)).fetchall()
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scheduler") as executor:
+            list(executor.map(lambda row: self._refresh_safe(row, now), due))
+        return len(due)
+
+    def _refresh_safe(self, row, now):
+        # Un domaine en échec ne bloque pas les autres : il sera retenté à la prochaine échéance
+        try:
+            self._refresh(row, now)
+        except Exception as e:
+            print(f"--- SCHEDULER {row['domain']} ({row['owner']}) : {e!r} ---")
+            with self._connection() as conn:
+                conn.execute(
+                    "UPDATE watchlist SET next_run = ? WHERE domain = ? AND owner = ?",
+                    (now + row["interval_s"], row["domain"], row["owner"]),
+                )
+
+    def _refresh(self, row, now):
+        previous = json.loads(row["last_result"]) if row["last_result"] else None
+        reuse = _reusable_checks(previous, row["last_run"], now) if previous else {}
+        # Certificat à re-vérifier : on passe outre le cache (qui le garderait jusqu'à l'expiration)
+        force_refresh = bool(previous) and "ssl" not in reuse
+        checked_at = dict(previous.get("checked_at", {})) if previous else {}
+        if "email" not in reuse:
+            checked_at["email"] = now
+        report = run_full_scan(row["domain"], force_refresh=force_refresh, reuse=reuse)
+        # Résolveur en panne : pas de comparaison (fausses alertes), retenté à la prochaine échéance
+        if scan_failed(report):
+            raise RuntimeError(f"audit en échec : {report['errors']}")
+        result = _compact(report, checked_at)
+        diffs = diff_results(previous, result) if previous else []
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT INTO scan_diffs (domain, owner, detected_at, kind, detail) VALUES (?, ?, ?, ?, ?)",
+                [(row["domain"], row["owner"], now, kind, detail) for kind, detail in diffs],
+            )
+            conn.execute(
+                "UPDATE watchlist SET last_run = ?, next_run = ?, last_result = ? WHERE domain = ? AND owner = ?",
+                (now, now + row["interval_s"], json.dumps(result), row["domain"], row["owner"]),
+            )
+
+class SchedulerWorker:
+    # Thread de fond qui lance les re-audits arrivés à échéance
+    def __init__(self, scheduler, tick=SCHEDULER_TICK):
+        self.scheduler = scheduler
+        self.tick = tick
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="scheduler")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.scheduler.run_due()
+            except Exception as e:
+                # Base verrouillée, disque plein... : le thread survit et réessaie au tour suivant
+                print(f"--- SCHEDULER : {e!r} ---")
+            self._stop.wait(self.tick)
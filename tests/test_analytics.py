@@ -0,0 +1,40 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics
+from scanner_logic import SCORE_WEIGHTS, calculate_score
+
+def _result(domain, ssl=True, days_left=60, ports=(), dmarc=True, headers=True, hsts=True):
+    return {
+        "domain": domain,
+        "ssl": {"status": ssl, "days_left": days_left, "issuer": "CA"},
+        "open_ports": list(ports),
+        "email": {"dmarc": dmarc},
+        "headers": {"status": headers, "hsts": hsts, "missing": []},
+    }
+
+RESULTS = [
+    _result("ok.com"),
+    _result("expiring.com", days_left=5, ports=(22,)),
+    _result("bad.com", ssl=False, ports=(21, 22, 3389), dmarc=False, headers=False, hsts=False),
+    _result("nohsts.com", hsts=False),
+]
+
+def _scalar_scores(weights):
+    return [
+        calculate_score(r["ssl"], r["open_ports"], r["email"], r["headers"], dict(SCORE_WEIGHTS, **weights))
+        for r in RESULTS
+    ]
+
+def test_score_frame_matches_calculate_score():
+    scores = analytics.score_frame(analytics.frame_from_results(RESULTS))
+    assert scores.tolist() == _scalar_scores({})
+
+def test_custom_weights_never_go_negative():
+    # En-têtes à 0 et pénalité HSTS : nohsts.com passerait à -5
+    weights = {"ssl": 0, "ssl_expiring": 0, "ports": 0, "email": 0, "headers": 0, "missing_hsts": 5}
+    scores = analytics.score_frame(analytics.frame_from_results(RESULTS), weights)
+    assert scores.tolist() == _scalar_scores(weights) == [0, 0, 0, 0]
+    assert analytics.score_distribution(scores).tolist() == [4, 0, 0]
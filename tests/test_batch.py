@@ -0,0 +1,99 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import scanner_logic
+from scanner_logic import scan_batch
+
+def _resolution(domain, ip):
+    return {"domain": domain, "addresses": [ip] if ip else [], "nxdomain": not ip, "records": {}, "duration": 0.0}
+
+class FakeScans:
+    # run_full_scan factice : durée fixe, suivi de la charge par IP
+    def __init__(self, ips, duration=0.01, failing=()):
+        self.ips = ips
+        self.duration = duration
+        self.failing = set(failing)
+        self.lock = threading.Lock()
+        self.load = {}
+        self.max_load = {}
+        self.running = 0
+        self.max_running = 0
+
+    def resolve_targets(self, domains, force_refresh=False):
+        return {d: _resolution(d, self.ips[d]) for d in domains}
+
+    def run_full_scan(self, domain, resolution=None, **options):
+        ip = scanner_logic.host_key(resolution)
+        with self.lock:
+            self.load[ip] = self.load.get(ip, 0) + 1
+            self.max_load[ip] = max(self.max_load.get(ip, 0), self.load[ip])
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(self.duration)
+            if domain in self.failing:
+                raise RuntimeError("boom")
+            return {"domain": domain, "score": 100}
+        finally:
+            with self.lock:
+                self.load[ip] -= 1
+                self.running -= 1
+
+@pytest.fixture
+def fake(monkeypatch):
+    def install(ips, **kwargs):
+        scans = FakeScans(ips, **kwargs)
+        monkeypatch.setattr(scanner_logic, "resolve_targets", scans.resolve_targets)
+        monkeypatch.setattr(scanner_logic, "run_full_scan", scans.run_full_scan)
+        return scans
+    return install
+
+def test_every_domain_scanned_once_per_host_limit_respected(fake):
+    ips = {f"site{i}.fr": f"10.0.0.{i % 5}" for i in range(40)}
+    scans = fake(ips)
+    results = list(scan_batch(list(ips) + ["SITE1.fr", "www.site2.fr"], max_workers=8, per_host=2))
+    assert sorted(r["domain"] for r in results) == sorted(ips)
+    assert max(scans.max_load.values()) == 2
+
+def test_hosts_grouped_in_input_do_not_stall_batch(fake):
+    # 8 IP, domaines listés par IP : la fenêtre de lecture initiale ne voit qu'une seule IP
+    ips = {f"d{ip}-{i}.com": f"10.0.1.{ip}" for ip in range(8) for i in range(40)}
+    scans = fake(ips, duration=0.02)
+    start = time.perf_counter()
+    results = list(scan_batch(ips, max_workers=16, per_host=1))
+    elapsed = time.perf_counter() - start
+    assert len(results) == len(ips)
+    assert scans.max_running == 8
+    # Idéal : 40 audits de 20 ms par IP en série ; une seule IP à la fois prendrait ~6,4 s
+    assert elapsed < 2.5
+
+def test_lookahead_is_capped(fake, monkeypatch):
+    monkeypatch.setattr(scanner_logic, "BATCH_MAX_DEFERRED", 20)
+    ips = {f"same{i}.com": "10.0.2.1" for i in range(100)}
+    consumed = []
+
+    def source():
+        for domain in ips:
+            consumed.append(domain)
+            yield domain
+
+    fake(ips, duration=0.001)
+    batch = scan_batch(source(), max_workers=4, per_host=1)
+    next(batch)
+    # Au plus le plafond plus un bloc de lecture d'avance
+    assert len(consumed) <= 20 + 4 * 4
+    assert len(list(batch)) == 99
+
+def test_failed_scan_yields_fallback_and_batch_continues(fake):
+    ips = {"ok1.com": "10.0.3.1", "bad.com": "10.0.3.2", "ok2.com": "10.0.3.3"}
+    fake(ips, failing={"bad.com"})
+    results = {r["domain"]: r for r in scan_batch(ips, max_workers=2)}
+    assert set(results) == set(ips)
+    assert results["bad.com"]["errors"] == {"scan": "other"}
+    assert results["ok1.com"]["score"] == 100
@@ -0,0 +1,33 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discovery
+
+def test_scan_all_limits_scans_per_ip(monkeypatch):
+    # 12 hôtes sur 3 IP : jamais plus de per_host audits simultanés sur une IP
+    lock = threading.Lock()
+    load, max_load = {}, {}
+
+    def scan_host(name, options, parent_domain, parent_email):
+        ip = options["resolution"]["addresses"][0]
+        with lock:
+            load[ip] = load.get(ip, 0) + 1
+            max_load[ip] = max(max_load.get(ip, 0), load[ip])
+        time.sleep(0.01)
+        with lock:
+            load[ip] -= 1
+        return {"domain": name, "deadline": options["deadline"]}
+
+    monkeypatch.setattr(discovery, "_scan_host", scan_host)
+    jobs = [
+        (f"h{i}.client.com", {"deadline": 2.5, "resolution": {"domain": f"h{i}.client.com", "addresses": [f"192.0.2.{i % 3}"]}})
+        for i in range(12)
+    ]
+    reports = discovery._scan_all(jobs, 8, "client.com", None, per_host=2)
+    assert sorted(reports) == sorted(name for name, _ in jobs)
+    assert max(max_load.values()) == 2
+    assert {r["deadline"] for r in reports.values()} == {2.5}
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import scanner_logic
+
+@pytest.fixture
+def dns_answers(monkeypatch):
+    # query_dns factice : {(nom, type): réponse}, None = résolveur en panne
+    answers = {}
+
+    async def query_dns(name, rdtype, force_refresh=False):
+        return answers.get((name, rdtype), ([], 300))
+
+    def no_system_resolver(domain):
+        raise OSError("no system resolver")
+
+    monkeypatch.setattr(scanner_logic, "query_dns", query_dns)
+    monkeypatch.setattr(scanner_logic, "_resolve_addresses", no_system_resolver)
+    return answers
+
+def test_negative_answers_mean_nxdomain(dns_answers):
+    resolution = scanner_logic.resolve_target("absent.example")
+    assert resolution["nxdomain"] and resolution["error"] is None
+
+def test_resolver_failure_is_not_nxdomain(dns_answers):
+    dns_answers[("down.example", "A")] = None
+    resolution = scanner_logic.resolve_target("down.example")
+    assert not resolution["nxdomain"]
+    assert resolution["error"] == "dns"
+    report = scanner_logic.run_full_scan("down.example", resolution=resolution)
+    assert report["errors"] == {"dns": "dns"}
+    assert scanner_logic.scan_failed(report)
+
+def test_addresses_win_over_partial_failure(dns_answers):
+    dns_answers[("v4.example", "A")] = (["192.0.2.1"], 300)
+    dns_answers[("v4.example", "AAAA")] = None
+    resolution = scanner_logic.resolve_target("v4.example")
+    assert resolution["addresses"] == ["192.0.2.1"]
+    assert not resolution["nxdomain"] and resolution["error"] is None
+
+def test_malformed_name_is_nxdomain(monkeypatch):
+    async def query_dns(name, rdtype, force_refresh=False):
+        return None
+    monkeypatch.setattr(scanner_logic, "query_dns", query_dns)
+    report = scanner_logic.run_full_scan("a..com")
+    assert report["errors"] == {"dns": "nxdomain"}
+    assert not scanner_logic.scan_failed(report)
+
+def _spf(record):
+    return asyncio.run(scanner_logic._expand_spf(record))
+
+def _txt(answers, name, record):
+    answers[(name, "TXT")] = ([record], 300)
+
+def test_spf_counts_nested_lookups(dns_answers):
+    _txt(dns_answers, "a.example", "v=spf1 ip4:192.0.2.0/24 include:b.example")
+    _txt(dns_answers, "b.example", "v=spf1 a -all")
+    # include:a (1) + include:b (1) + a (1) + mx (1) + a (1) ; ip4 et all ne coûtent rien
+    assert _spf("v=spf1 include:a.example mx a ~all") == (5, None)
+
+def test_spf_redirect_counts_like_include(dns_answers):
+    _txt(dns_answers, "r.example", "v=spf1 mx -all")
+    assert _spf("v=spf1 redirect=r.example") == (2, None)
+
+def test_spf_repeated_include_counted_twice_fetched_once(dns_answers, monkeypatch):
+    _txt(dns_answers, "x.example", "v=spf1 a")
+    queried = []
+    query_dns = scanner_logic.query_dns
+
+    async def counting(name, rdtype, force_refresh=False):
+        queried.append(name)
+        return await query_dns(name, rdtype, force_refresh)
+
+    monkeypatch.setattr(scanner_logic, "query_dns", counting)
+    assert _spf("v=spf1 include:x.example include:x.example") == (4, None)
+    assert queried == ["x.example"]
+
+def test_spf_include_loop(dns_answers):
+    _txt(dns_answers, "a.example", "v=spf1 include:b.example")
+    _txt(dns_answers, "b.example", "v=spf1 include:a.example")
+    assert _spf("v=spf1 include:a.example") == (None, "loop")
+
+def test_spf_missing_include(dns_answers):
+    assert _spf("v=spf1 include:absent.example") == (None, "include_not_found")
+
+def test_spf_too_many_lookups(dns_answers):
+    assert _spf("v=spf1 " + " ".join(["a"] * scanner_logic.SPF_MAX_LOOKUPS) + " -all") == (scanner_logic.SPF_MAX_LOOKUPS, None)
+    assert _spf("v=spf1 " + " ".join(["a"] * (scanner_logic.SPF_MAX_LOOKUPS + 1))) == (None, "too_many_lookups")
+
+def test_spf_expansion_stops_past_limit(dns_answers, monkeypatch):
+    # Onze includes distincts : inutile de descendre au niveau suivant
+    for i in range(scanner_logic.SPF_MAX_LOOKUPS + 1):
+        _txt(dns_answers, f"i{i}.example", f"v=spf1 include:deep{i}.example")
+    queried = []
+    query_dns = scanner_logic.query_dns
+
+    async def counting(name, rdtype, force_refresh=False):
+        queried.append(name)
+        return await query_dns(name, rdtype, force_refresh)
+
+    monkeypatch.setattr(scanner_logic, "query_dns", counting)
+    record = "v=spf1 " + " ".join(f"include:i{i}.example" for i in range(scanner_logic.SPF_MAX_LOOKUPS + 1))
+    assert _spf(record) == (None, "too_many_lookups")
+    assert not any(name.startswith("deep") for name in queried)
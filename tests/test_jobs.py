@@ -0,0 +1,131 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import jobs
+from jobs import JobQueue, JobWorkers
+from scan_store import ScanStore
+
+def _result(domain):
+    return {
+        "domain": domain,
+        "score": 50,
+        "ssl": {"status": True, "days_left": 30, "issuer": "CA"},
+        "open_ports": [],
+        "email": {"dmarc": True},
+        "headers": {"status": True, "hsts": True, "missing": []},
+    }
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    return JobQueue(path), ScanStore(path)
+
+@pytest.fixture
+def scanned(monkeypatch):
+    # scan_batch factice : rend un résultat par domaine, sans réseau, en notant l'ordre
+    order = []
+
+    def scan_batch(domains, **options):
+        for domain in domains:
+            order.append(domain)
+            yield _result(domain)
+
+    monkeypatch.setattr(jobs, "scan_batch", scan_batch)
+    return order
+
+def _wait(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_claims_alternate_between_owners(db):
+    queue, _ = db
+    big = queue.submit("alice", [f"a{i}.com" for i in range(10)])
+    small = queue.submit("bob", [f"b{i}.com" for i in range(4)])
+    claims = []
+    for _ in range(4):
+        job, domains = queue.claim_chunk(2)
+        claims.append((job["owner"], domains))
+        queue.finish_chunk(job["id"])
+    # Un paquet par utilisateur à tour de rôle, malgré le job d'alice soumis avant
+    assert [owner for owner, _ in claims] == ["alice", "bob", "alice", "bob"]
+    assert claims[1][1] == ["b0.com", "b1.com"]
+    assert queue.get(small)["status"] == "done"
+    assert queue.get(big)["status"] == "running"
+
+def test_owner_with_chunk_in_flight_waits(db):
+    queue, _ = db
+    queue.submit("alice", [f"a{i}.com" for i in range(4)])
+    queue.submit("alice", [f"c{i}.com" for i in range(4)])
+    queue.submit("bob", [f"b{i}.com" for i in range(4)])
+    # Paquets en cours, non terminés : alice (2 jobs) ne passe pas devant bob
+    owners = [queue.claim_chunk(2)[0]["owner"] for _ in range(4)]
+    assert owners == ["alice", "bob", "alice", "bob"]
+
+def test_interrupted_job_resumes_without_rescanning(db, scanned):
+    queue, store = db
+    job_id = queue.submit("alice", [f"a{i}.com" for i in range(8)])
+    job, domains = queue.claim_chunk(4)
+    store.save_scans([_result(d) for d in domains[:3]], job_id, "alice")
+    queue.add_done(job_id, 3)
+    # Arrêt du serveur au milieu du paquet : requeue_interrupted au démarrage des workers
+    workers = JobWorkers(queue, store, nb_workers=1)
+    try:
+        assert _wait(lambda: queue.get(job_id)["status"] == "done")
+    finally:
+        workers.stop()
+    assert sorted(scanned) == [f"a{i}.com" for i in range(3, 8)]
+    assert queue.get(job_id)["done"] == 8
+    assert store.count_scans(job_id=job_id) == 8
+
+def test_progress_saved_while_chunk_runs(db, monkeypatch):
+    queue, store = db
+    release = threading.Event()
+
+    def scan_batch(domains, **options):
+        for i, domain in enumerate(domains):
+            if i == jobs.JOB_SAVE_EVERY:
+                release.wait(5)
+            yield _result(domain)
+
+    monkeypatch.setattr(jobs, "scan_batch", scan_batch)
+    job_id = queue.submit("alice", [f"a{i}.com" for i in range(jobs.JOB_SAVE_EVERY + 5)])
+    workers = JobWorkers(queue, store, nb_workers=1)
+    try:
+        # Le paquet n'est pas fini, mais le premier lot est déjà enregistré et compté
+        assert _wait(lambda: queue.get(job_id)["done"] == jobs.JOB_SAVE_EVERY)
+        assert store.count_scans(job_id=job_id) == jobs.JOB_SAVE_EVERY
+        release.set()
+        assert _wait(lambda: queue.get(job_id)["status"] == "done")
+    finally:
+        release.set()
+        workers.stop()
+    assert queue.get(job_id)["done"] == jobs.JOB_SAVE_EVERY + 5
+
+def test_surface_job_runs_in_background(db, scanned, monkeypatch):
+    queue, store = db
+
+    def audit_surface(domain, **options):
+        hosts = [dict(_result(name), addresses=["192.0.2.1"]) for name in (domain, f"www2.{domain}")]
+        return {"domain": domain, "hosts": hosts, "score": 50, "options": options}
+
+    monkeypatch.setattr(jobs, "audit_surface", audit_surface)
+    queue.submit("alice", ["a.com"])
+    job_id = queue.submit("alice", ["client.com"], kind="surface", port_profile="databases")
+    assert [job["id"] for job in queue.list_jobs("alice", kind="surface")] == [job_id]
+    workers = JobWorkers(queue, store, nb_workers=1)
+    try:
+        assert _wait(lambda: queue.get(job_id)["status"] == "done")
+    finally:
+        workers.stop()
+    surface = queue.get(job_id)["result"]
+    assert surface["options"] == {"port_profile": "databases"}
+    assert [h["domain"] for h in surface["hosts"]] == ["client.com", "www2.client.com"]
+    assert store.count_scans(job_id=job_id, owner="alice") == 2
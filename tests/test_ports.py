@@ -0,0 +1,70 @@
+import asyncio
+import errno
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import scanner_logic
+
+RESOLUTION = {"domain": "ports.example", "addresses": ["192.0.2.10"], "nxdomain": False, "records": {}, "error": None}
+
+class FakeWriter:
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+@pytest.fixture
+def connections(monkeypatch):
+    # asyncio.open_connection factice : {port: exception}, sinon port ouvert ; suivi des sockets simultanés
+    state = {"errors": {}, "open": 0, "max_open": 0}
+
+    async def open_connection(ip, port):
+        state["open"] += 1
+        state["max_open"] = max(state["max_open"], state["open"])
+        try:
+            await asyncio.sleep(0.01)
+            if port in state["errors"]:
+                raise state["errors"][port]
+            return None, FakeWriter()
+        finally:
+            state["open"] -= 1
+
+    monkeypatch.setattr(scanner_logic.asyncio, "open_connection", open_connection)
+    return state
+
+def test_socket_budget_shared_by_all_scans(connections, monkeypatch):
+    monkeypatch.setattr(scanner_logic, "PORT_SOCKETS", threading.BoundedSemaphore(4))
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(
+            scanner_logic.check_ports("ports.example", list(range(8000, 8010)), force_refresh=True, resolution=RESOLUTION)
+        ))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [list(range(8000, 8010))] * 3
+    assert connections["max_open"] == 4
+
+def test_refused_port_is_closed(connections):
+    connections["errors"][22] = ConnectionRefusedError()
+    assert scanner_logic.check_ports("ports.example", [22, 443], force_refresh=True, resolution=RESOLUTION) == [443]
+
+def test_local_socket_error_fails_check_instead_of_closed(connections):
+    connections["errors"][22] = OSError(errno.EMFILE, "Too many open files")
+    with pytest.raises(OSError):
+        scanner_logic.check_ports("ports.example", [22, 25], force_refresh=True, resolution=RESOLUTION)
+    # Rien en cache : le prochain audit refait le scan
+    assert scanner_logic.RESULT_CACHE.get(("ports", "ports.example", (22, 25))) is None
+    reuse = {name: scanner_logic.FALLBACK_RESULTS[name] for name in ("ssl", "headers", "email")}
+    report = scanner_logic.run_full_scan("ports.example", port_profile=[22, 25], resolution=RESOLUTION, reuse=reuse)
+    assert report["errors"]["open_ports"] == "network"
+    assert report["open_ports"] == []
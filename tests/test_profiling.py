@@ -0,0 +1,27 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scanner_logic
+
+RESOLUTION = {"domain": "slow.example", "addresses": ["192.0.2.20"], "nxdomain": False, "records": {}, "error": None}
+
+def test_profiled_checks_get_a_deadline_each(monkeypatch, tmp_path):
+    # Trois checks de 0,3 s : en parallèle ils tiennent dans 0,5 s, en série (profilage) non
+    def slow(*results):
+        def check(*args, **kwargs):
+            time.sleep(0.3)
+            return results if len(results) > 1 else results[0]
+        return check
+
+    fallback = scanner_logic.FALLBACK_RESULTS
+    monkeypatch.setattr(scanner_logic, "_tls_checks", slow(fallback["ssl"], fallback["headers"]))
+    monkeypatch.setattr(scanner_logic, "check_ports", slow([]))
+    monkeypatch.setattr(scanner_logic, "check_email_security", slow(fallback["email"]))
+    plain = scanner_logic.run_full_scan("slow.example", deadline=0.5, resolution=RESOLUTION, profile_dir=None)
+    assert plain["errors"] == {}
+    profiled = scanner_logic.run_full_scan("slow.example", deadline=0.5, resolution=RESOLUTION, profile_dir=str(tmp_path))
+    assert profiled["errors"] == {}
+    assert os.path.exists(profiled["profile"])
@@ -0,0 +1,31 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from ratelimit import TokenBucket
+
+def test_burst_then_rate():
+    bucket = TokenBucket(rate=10, burst=3)
+    now = bucket.updated
+    assert [bucket.reserve(now) for _ in range(3)] == [0.0, 0.0, 0.0]
+    # Au-delà de la rafale, chaque réservation attend son tour (un jeton tous les 1/10 s)
+    assert bucket.reserve(now) == pytest.approx(0.1)
+    assert bucket.reserve(now) == pytest.approx(0.2)
+
+def test_refill_capped_at_burst():
+    bucket = TokenBucket(rate=10, burst=3)
+    now = bucket.updated + 60
+    assert [bucket.reserve(now) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve(now) == pytest.approx(0.1)
+
+def test_waiting_reservations_are_paid_back():
+    bucket = TokenBucket(rate=10, burst=1)
+    now = bucket.updated
+    bucket.reserve(now)
+    assert bucket.reserve(now) == pytest.approx(0.1)
+    # 0,1 s plus tard le jeton emprunté est remboursé, le suivant attend encore 0,1 s
+    assert bucket.reserve(now + 0.1) == pytest.approx(0.1)
+    assert bucket.reserve(now + 0.5) == 0.0
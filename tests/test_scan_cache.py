@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import scan_cache
+from scan_cache import TTLCache
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(scan_cache.time, "monotonic", lambda: now[0])
+    return now
+
+def test_entry_expires_after_ttl(clock):
+    cache = TTLCache()
+    cache.set("a", 1, ttl=10)
+    clock[0] += 9.9
+    assert cache.get("a") == 1
+    clock[0] += 0.1
+    assert cache.get("a", "absent") == "absent"
+    assert len(cache) == 0
+
+def test_non_positive_ttl_is_not_cached(clock):
+    cache = TTLCache()
+    cache.set("a", 1, ttl=0)
+    assert cache.get("a") is None
+
+def test_least_recently_used_entry_evicted(clock):
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    # Lire "a" le rend récent : c'est "b" qui sort
+    assert cache.get("a") == 1
+    cache.set("c", 3, ttl=60)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
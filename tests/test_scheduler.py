@@ -0,0 +1,96 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import CERT_RECHECK_DAYS, DAY, _reusable_checks, diff_results
+from scanner_logic import CERT_REFRESH_MARGIN
+
+NOW = 1_700_000_000.0
+
+def _result(score=80, ports=(), hsts=True, dmarc=True, ssl_status=True, days_left=60, **ssl):
+    return {
+        "domain": "exemple.com",
+        "score": score,
+        "ssl": {"status": ssl_status, "days_left": days_left, "issuer": "CA", **ssl},
+        "open_ports": list(ports),
+        "email": {"dmarc": dmarc, "ttl": 3600},
+        "headers": {"status": True, "hsts": hsts, "missing": []},
+    }
+
+def test_certificate_reused_with_days_left_from_expiry():
+    previous = _result(fetched_at=NOW - 2 * DAY, expires_at=NOW + 60 * DAY + 100)
+    reuse = _reusable_checks(previous, NOW - DAY, NOW)
+    assert reuse["ssl"]["days_left"] == 60
+    # Passage suivant, une semaine plus tard moins un jour : le compte à rebours continue
+    reuse = _reusable_checks(dict(previous, ssl=reuse["ssl"]), NOW, NOW + 4 * DAY)
+    assert reuse["ssl"]["days_left"] == 56
+
+def test_certificate_refetched_weekly_even_if_reused_every_day():
+    previous = _result(fetched_at=NOW, expires_at=NOW + 300 * DAY)
+    now = NOW
+    for _ in range(CERT_RECHECK_DAYS - 1):
+        now += DAY
+        reuse = _reusable_checks(previous, now - DAY, now)
+        assert "ssl" in reuse
+        previous = dict(previous, ssl=reuse["ssl"])
+    now += DAY
+    assert "ssl" not in _reusable_checks(previous, now - DAY, now)
+
+def test_certificate_refetched_near_expiry():
+    previous = _result(fetched_at=NOW, expires_at=NOW + CERT_REFRESH_MARGIN * DAY)
+    assert "ssl" not in _reusable_checks(previous, NOW, NOW + 1)
+
+def test_certificate_without_timestamps_is_refetched():
+    assert "ssl" not in _reusable_checks(_result(), NOW - 60, NOW)
+    assert "ssl" not in _reusable_checks(_result(ssl_status=False, days_left=0), NOW - 60, NOW)
+
+def test_email_ttl_counted_from_last_fetch():
+    previous = dict(_result(), checked_at={"email": NOW - 3000})
+    assert "email" in _reusable_checks(previous, NOW - 60, NOW)
+    assert "email" not in _reusable_checks(previous, NOW - 60, NOW + 1000)
+    assert "email" not in _reusable_checks(dict(previous, email={"dmarc": False, "error": "timeout"}), NOW - 60, NOW)
+
+def test_diff_results_no_change():
+    assert diff_results(_result(), _result()) == []
+
+def test_diff_results_changes():
+    previous = _result(score=80, ports=(443,), days_left=10)
+    current = _result(score=60, ports=(22, 443), hsts=False, dmarc=False, days_left=90)
+    diffs = dict(diff_results(previous, current))
+    assert diffs["score_drop"] == "80 -> 60"
+    assert diffs["port_opened"] == "22"
+    assert "hsts_removed" in diffs
+    assert "dmarc_removed" in diffs
+    assert diffs["cert_renewed"] == "90 jours restants"
+
+def test_diff_results_ssl_status_and_closed_ports():
+    previous = _result(score=60, ports=(22, 3389), ssl_status=False, days_left=0, hsts=False, dmarc=False)
+    current = _result(score=90, ports=(22,))
+    diffs = dict(diff_results(previous, current))
+    assert diffs["score_up"] == "60 -> 90"
+    assert diffs["port_closed"] == "3389"
+    assert diffs["ssl_valid"] == "CA"
+    assert "hsts_added" in diffs and "dmarc_added" in diffs
+
+def test_worker_survives_run_due_errors(tmp_path):
+    import sqlite3
+    import time
+    from scheduler import Scheduler, SchedulerWorker
+    scheduler = Scheduler(str(tmp_path / "watch.db"))
+    calls = []
+
+    def run_due():
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+
+    scheduler.run_due = run_due
+    worker = SchedulerWorker(scheduler, tick=0.01)
+    try:
+        deadline = time.time() + 2
+        while len(calls) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        assert len(calls) >= 3 and worker._thread.is_alive()
+    finally:
+        worker.stop()